@@ -1,146 +1,1059 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from functools import lru_cache
 import dash
-from dash import html, dcc, Input, Output
-import plotly.graph_objects as go
+from dash import html, dcc, Input, Output, State, ALL
+from dash.exceptions import PreventUpdate
+from flask import Response, jsonify, request
 import pandas as pd
 from funciones import (
+    MESES,
+    CLAVES_CUBO,
+    RUTA_ORIGEN,
+    estado_origen,
+    listar_años,
+    describir_periodo,
     cargar_datos,
+    validar_datos,
+    leer_validacion,
+    enriquecer_gastos,
+    concatenar_consolidado,
+    validar_calendario,
+    leer_gastos_nuevos,
+    normalizar_gastos_nuevos,
+    actualizar_cubo,
+    construir_indice_presupuesto,
+    filtrar_presupuesto,
+    construir_cubo,
+    filtrar_cubo,
     calcular_metricas,
+    pronosticar_gasto,
+    filtrar_pronostico,
+    agregar_por_mes,
+    resumir_tabla,
+    resumir_cubo,
+    resumir_eficiencia,
+    resumir_periodos,
+    COLUMNAS_TABLA,
+    COLUMNAS_PRONOSTICO,
+    paginar_tabla,
+    serializar_figura,
     crear_grafico_velocimetro,
     crear_grafico_barras_categoria,
     crear_grafico_lineas_mes,
     crear_tabla_matriz,
     crear_grafico_anillo_semestre,
     crear_grafico_columnas_trimestre,
-    crear_grafico_radar_eficiencia
+    crear_grafico_radar_eficiencia,
+    construir_indice_detalle,
+    rangos_fechas,
+    detallar_gastos,
+    serie_diaria,
+    crear_grafico_detalle,
+    paginar_detalle,
+    crear_tabla_detalle,
+    FILAS_POR_PAGINA
 )
+import instrumentacion
+from instrumentacion import medir
+from exportacion import TIPOS_MIME, exportar, formato_disponible
 
 # Inicializar la aplicación Dash
-app = dash.Dash(__name__)
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
+server = app.server
 
-# Cargar y procesar los datos
-df_gastos, df_presupuesto, df_calendario, df_consolidado = cargar_datos()
+# Cargar y procesar los datos (mapeados en memoria compartida bajo gunicorn)
+MEMORIA_COMPARTIDA = os.environ.get('DASHBOARD_MEMORIA_COMPARTIDA') == '1'
 
-# Calcular métricas principales
-total_gastado, total_presupuesto, saldo, porcentaje_gasto = calcular_metricas(df_consolidado)
+# Con DASHBOARD_CARGA_DIFERIDA=1 la importación no lee los datos: se cargan en
+# la primera solicitud o en el calentamiento (hilo de recarga o arranque.py)
+CARGA_DIFERIDA = os.environ.get('DASHBOARD_CARGA_DIFERIDA') == '1'
 
-# Layout de la aplicación
-app.layout = html.Div([
-    # Header
-    html.Div([
-        html.H1('Dashboard de Análisis de Gastos del Área de Recursos Humanos', 
-                className='dashboard-title'),
-        html.Div('Enero - Agosto de 2019', className='dashboard-subtitle')
-    ], className='header'),
-    
-    # Contenedor principal
-    html.Div([
-        # Fila superior con métricas principales
+class Instantanea:
+    """Conjunto de datos versionado que leen los callbacks; nunca se modifica en sitio"""
+    
+    def __init__(self, version, df_consolidado, cubo, indice_presupuesto, df_calendario,
+                 derivar_fechas, origen=None, archivos_aplicados=frozenset(), validacion=None):
+        self.version = version
+        self.df_consolidado = df_consolidado
+        self.cubo = cubo
+        self.indice_presupuesto = indice_presupuesto
+        self.df_calendario = df_calendario
+        self.derivar_fechas = derivar_fechas
+        self.origen = origen
+        self.archivos_aplicados = archivos_aplicados
+        self.validacion = validacion
+    
+    def reemplazar(self, **cambios):
+        """Copia de la instantánea con algunos atributos cambiados"""
+        return Instantanea(**{**vars(self), **cambios})
+
+def huella_origen():
+    """Identificar la versión del origen (libro o directorio de libros) por mtime y tamaño"""
+    return estado_origen(RUTA_ORIGEN)
+
+def cargar_instantanea(version):
+    """Leer el libro (o su caché) y construir todos los agregados de una instantánea"""
+    # La huella se toma antes de leer: un cambio durante la carga provoca otra recarga
+    origen = huella_origen()
+    df_gastos, df_presupuesto, df_calendario, df_consolidado = cargar_datos(compartido=MEMORIA_COMPARTIDA)
+    # El reporte de validación viene de la caché; sólo se recalcula si falta
+    validacion = leer_validacion()
+    if validacion is None:
+        validacion = validar_datos(df_gastos, df_presupuesto, df_calendario, df_consolidado)
+    return Instantanea(
+        version,
+        df_consolidado,
+        # Pre-agregar el consolidado; todos los gráficos leen del cubo
+        construir_cubo(df_consolidado),
+        # Índice de presupuesto por cuenta, unido a nivel agregado
+        construir_indice_presupuesto(df_presupuesto),
+        df_calendario,
+        # Los deltas usan la derivación vectorizada de fechas si el calendario la confirma
+        validar_calendario(df_calendario),
+        origen,
+        validacion=validacion
+    )
+
+# Instantánea vigente: se reemplaza completa bajo el bloqueo, los lectores no bloquean
+datos = None if CARGA_DIFERIDA else cargar_instantanea(0)
+bloqueo_datos = threading.Lock()
+
+def asegurar_datos():
+    """Devolver la instantánea vigente, cargándola si la carga se difirió"""
+    if datos is None:
+        with bloqueo_datos:
+            if datos is None:
+                publicar(cargar_instantanea(0))
+    return datos
+
+def filtrar_vista(estado, años, meses, categorias, cuentas, departamentos):
+    """Celdas del cubo y presupuesto (escalado a los años de la vista) para los filtros"""
+    vista = filtrar_cubo(estado.cubo, años, meses, categorias, cuentas, departamentos)
+    n_años = len(años) if años else estado.cubo['Año'].nunique()
+    presupuesto = filtrar_presupuesto(estado.indice_presupuesto, categorias, cuentas, departamentos, n_años)
+    return vista, presupuesto
+
+@lru_cache(maxsize=4)
+def pronostico_datos(estado):
+    """Pronóstico de cierre por año y cuenta, calculado una vez por instantánea"""
+    return pronosticar_gasto(estado.cubo, estado.indice_presupuesto)
+
+@lru_cache(maxsize=256)
+@medir
+def preparar_vista(estado, años, meses, categorias, cuentas, departamentos):
+    """Calcular los agregados que comparten todas las salidas para un estado de filtros
+    
+    Los filtros son tuplas normalizadas (o None) para que, junto con la
+    instantánea, sirvan de clave del caché LRU.
+    """
+    vista, presupuesto = filtrar_vista(estado, años, meses, categorias, cuentas, departamentos)
+    return {
+        'vista': vista,
+        'presupuesto': presupuesto,
+        'metricas': calcular_metricas(vista, presupuesto),
+        'df_mensual': agregar_por_mes(vista),
+        # El pronóstico es del año completo: no se restringe por meses
+        'pronostico': filtrar_pronostico(pronostico_datos(estado), años, categorias, cuentas, departamentos),
+        # El velocímetro compara con el presupuesto de todos los años de la
+        # vista, así que proyecta cada uno de ellos (los cerrados, a su gasto real)
+        'proyeccion': filtrar_pronostico(pronostico_datos(estado), años, categorias, cuentas, departamentos,
+                                         todos_los_años=True)['Proyección'].sum()
+    }
+
+def _salida_velocimetro(agregados, nivel):
+    total_gastado, total_presupuesto, saldo, porcentaje_gasto = agregados['metricas']
+    proyeccion = agregados['proyeccion'] if len(agregados['pronostico']) else None
+    return (
+        serializar_figura(crear_grafico_velocimetro(total_gastado, total_presupuesto, proyeccion)),
+        f'{porcentaje_gasto:.1f} %' if porcentaje_gasto is not None else '—',
+        f'{saldo:,.0f}',
+        f'{total_presupuesto:,.0f}'
+    )
+
+# Constructores de cada componente a partir de los agregados compartidos
+CONSTRUCTORES = {
+    'velocimetro': _salida_velocimetro,
+    'grafico-categorias': lambda agregados, nivel: serializar_figura(
+        crear_grafico_barras_categoria(agregados['vista'])),
+    'grafico-meses': lambda agregados, nivel: serializar_figura(
+        crear_grafico_lineas_mes(agregados['df_mensual'])),
+    'grafico-semestre': lambda agregados, nivel: serializar_figura(
+        crear_grafico_anillo_semestre(agregados['df_mensual'], agregados['metricas'][1])),
+    'tabla-matriz': lambda agregados, nivel: crear_tabla_matriz(
+        agregados['vista'], agregados['presupuesto'], nivel, agregados['pronostico']),
+    'grafico-trimestre': lambda agregados, nivel: serializar_figura(
+        crear_grafico_columnas_trimestre(agregados['df_mensual'])),
+    'grafico-radar': lambda agregados, nivel: serializar_figura(
+        crear_grafico_radar_eficiencia(agregados['vista'], agregados['presupuesto'], agregados['pronostico']))
+}
+
+@lru_cache(maxsize=1024)
+@medir
+def construir_salida(nombre, estado, filtros, nivel=None):
+    """Salida de un componente para una instantánea y un estado de filtros
+    
+    La clave es (componente, instantánea, filtros); las figuras se guardan ya
+    serializadas, así los aciertos no vuelven a construir ni validar figuras.
+    """
+    return CONSTRUCTORES[nombre](preparar_vista(estado, *filtros), nivel)
+
+@lru_cache(maxsize=64)
+@medir
+def construir_tabla(estado, años, meses, categorias, cuentas, departamentos, nivel):
+    """Tabla matriz completa para un estado de filtros, usada por la paginación"""
+    vista, presupuesto = filtrar_vista(estado, años, meses, categorias, cuentas, departamentos)
+    pronostico = filtrar_pronostico(pronostico_datos(estado), años, categorias, cuentas, departamentos)
+    return resumir_tabla(vista, presupuesto, nivel, pronostico)
+
+@lru_cache(maxsize=4)
+def indice_detalle(estado):
+    """Índice por categoría y fecha del consolidado, construido una vez por instantánea"""
+    return construir_indice_detalle(estado.df_consolidado)
+
+@lru_cache(maxsize=64)
+@medir
+def construir_detalle(estado, seleccion, años, meses, categorias, cuentas, departamentos):
+    """Posiciones de los gastos seleccionados y su serie diaria para un estado de filtros
+    
+    seleccion es (categoría, cuenta); sin cuenta se detalla toda la categoría.
+    La página pedida se corta de las posiciones guardadas en el caché.
+    """
+    categoria, cuenta = seleccion
+    if not años:
+        años = listar_años(estado.cubo)
+    posiciones = detallar_gastos(estado.df_consolidado, indice_detalle(estado), categoria,
+                                 rangos_fechas(años, meses), [cuenta] if cuenta is not None else cuentas,
+                                 departamentos)
+    return {
+        'posiciones': posiciones,
+        'figura': serializar_figura(crear_grafico_detalle(*serie_diaria(estado.df_consolidado, posiciones)))
+    }
+
+def normalizar_filtros(años, meses, categorias, cuentas, departamentos):
+    """Convertir los valores de los controles en una clave hashable y canónica"""
+    def _tupla(valores):
+        return tuple(sorted(valores)) if valores else None
+    
+    if meses and tuple(meses) == (1, 12):
+        meses = None
+    return (_tupla(años), tuple(meses) if meses else None, _tupla(categorias), _tupla(cuentas),
+            _tupla(departamentos))
+
+# Ingesta incremental de gastos nuevos
+DIRECTORIO_ENTRADA = os.environ.get('DASHBOARD_DIR_ENTRADA', 'entrada_gastos')
+INTERVALO_ENTRADA = float(os.environ.get('DASHBOARD_INTERVALO_ENTRADA', '10'))
+
+# Los archivos que no se pueden leer o aplicar se apartan aquí para no
+# reintentarlos en cada revisión
+DIRECTORIO_RECHAZADOS = os.path.join(DIRECTORIO_ENTRADA, 'rechazados')
+
+def rechazar_archivo(nombre, error):
+    """Mover un archivo de entrada a la carpeta de rechazados y registrar el motivo"""
+    os.makedirs(DIRECTORIO_RECHAZADOS, exist_ok=True)
+    try:
+        os.replace(os.path.join(DIRECTORIO_ENTRADA, nombre), os.path.join(DIRECTORIO_RECHAZADOS, nombre))
+    except FileNotFoundError:
+        # Otro worker ya lo apartó
+        pass
+    server.logger.error('Archivo de gastos rechazado: %s (%s)', nombre, error)
+
+# Los archivos ya incorporados por algún worker se archivan aquí: el directorio
+# de entrada sólo muestra los pendientes, pero los demás workers y las
+# recargas del libro siguen leyéndolos (una vez cada uno, por nombre)
+DIRECTORIO_APLICADOS = os.path.join(DIRECTORIO_ENTRADA, 'aplicados')
+
+def archivar_archivos(nombres):
+    """Mover al directorio de aplicados los archivos de entrada ya incorporados"""
+    os.makedirs(DIRECTORIO_APLICADOS, exist_ok=True)
+    for nombre in nombres:
+        try:
+            os.replace(os.path.join(DIRECTORIO_ENTRADA, nombre), os.path.join(DIRECTORIO_APLICADOS, nombre))
+        except FileNotFoundError:
+            # Ya lo archivó otro worker
+            pass
+
+def aplicar_lotes(estado, lotes):
+    """Enriquecer sólo el delta y devolver la instantánea con el cubo actualizado
+    
+    Cada archivo se enriquece por separado: uno que falle se rechaza sin
+    impedir que se incorporen los demás. Si ninguno se pudo aplicar se
+    devuelve la misma instantánea.
+    
+    El consolidado nuevo es una copia privada del worker: con memoria
+    compartida, la primera ingesta deja de usar las páginas mapeadas de la
+    caché y cada worker paga el tamaño completo del consolidado hasta la
+    siguiente recarga del libro (ver dashboard_consolidado_bytes en /metrics).
+    """
+    deltas, aplicados = [], set()
+    for nombre, df_nuevos in lotes:
+        try:
+            _, df_delta = enriquecer_gastos(df_nuevos, estado.df_calendario, estado.indice_presupuesto,
+                                            estado.derivar_fechas)
+        except Exception as error:
+            rechazar_archivo(nombre, error)
+            continue
+        deltas.append(df_delta)
+        aplicados.add(nombre)
+    if not deltas:
+        return estado
+    
+    df_delta = pd.concat(deltas, ignore_index=True)
+    return estado.reemplazar(
+        version=estado.version + 1,
+        df_consolidado=concatenar_consolidado(estado.df_consolidado, df_delta),
+        cubo=actualizar_cubo(estado.cubo, df_delta),
+        archivos_aplicados=estado.archivos_aplicados | aplicados
+    )
+
+def publicar(nueva):
+    """Reemplazar la instantánea vigente (llamar con bloqueo_datos tomado)"""
+    global datos
+    datos = nueva
+    
+    # Las entradas de versiones anteriores ya no se consultarán
+    preparar_vista.cache_clear()
+    construir_salida.cache_clear()
+    construir_tabla.cache_clear()
+    construir_agregado.cache_clear()
+    construir_detalle.cache_clear()
+    pronostico_datos.cache_clear()
+    indice_detalle.cache_clear()
+    identificar_datos.cache_clear()
+
+@medir
+def agregar_gastos(lotes):
+    """Enriquecer sólo el delta, actualizar el cubo y publicar una nueva instantánea
+    
+    lotes es una lista de (nombre de archivo, DataFrame); los archivos ya
+    incorporados a la instantánea vigente se ignoran. La nueva instantánea se
+    arma sin el bloqueo, que sólo se toma para publicarla; si mientras tanto
+    se publicó otra (otra ingesta o una recarga) el delta se aplica sobre ella.
+    """
+    while True:
+        anterior = datos
+        pendientes = [(nombre, df) for nombre, df in lotes if nombre not in anterior.archivos_aplicados]
+        if not pendientes:
+            return anterior.version
+        nueva = aplicar_lotes(anterior, pendientes)
+        with bloqueo_datos:
+            if datos is anterior:
+                if nueva is not anterior:
+                    publicar(nueva)
+                break
+    archivar_archivos(nueva.archivos_aplicados - anterior.archivos_aplicados)
+    return nueva.version
+
+def leer_directorio_entrada(aplicados=frozenset()):
+    """Leer los archivos CSV/Parquet pendientes y archivados que no están en aplicados
+    
+    Se leen uno a uno: los que no se pueden leer o validar se rechazan y el
+    resto se devuelve normalmente.
+    """
+    rutas = {}
+    for directorio in (DIRECTORIO_APLICADOS, DIRECTORIO_ENTRADA):
+        if os.path.isdir(directorio):
+            rutas.update(
+                (nombre, os.path.join(directorio, nombre)) for nombre in os.listdir(directorio)
+                if nombre.endswith(('.csv', '.parquet')) and nombre not in aplicados
+            )
+    lotes = []
+    for nombre in sorted(rutas):
+        try:
+            lotes.append((nombre, leer_gastos_nuevos(rutas[nombre])))
+        except FileNotFoundError:
+            # Otro worker lo archivó o lo rechazó mientras tanto; se lee en la siguiente revisión
+            continue
+        except Exception as error:
+            rechazar_archivo(nombre, error)
+    return lotes
+
+def revisar_directorio_entrada():
+    """Aplicar los archivos del directorio de entrada aún no incorporados"""
+    # Sin datos cargados todavía no hay a qué aplicarlos
+    if datos is None:
+        return
+    lotes = leer_directorio_entrada(datos.archivos_aplicados)
+    if lotes:
+        agregar_gastos(lotes)
+
+def vigilar_directorio_entrada():
+    """Revisar periódicamente el directorio de entrada (hilo en segundo plano)"""
+    while True:
+        try:
+            revisar_directorio_entrada()
+        except Exception:
+            server.logger.exception('Error al incorporar gastos nuevos')
+        time.sleep(INTERVALO_ENTRADA)
+
+threading.Thread(target=vigilar_directorio_entrada, name='ingesta-gastos', daemon=True).start()
+
+# Recarga del libro de origen en segundo plano
+INTERVALO_RECARGA = float(os.environ.get('DASHBOARD_INTERVALO_RECARGA', '60'))
+
+def filtros_iniciales(estado):
+    """Filtros con los que abre la página: el último año, sin más restricciones"""
+    años = listar_años(estado.cubo)
+    return normalizar_filtros(años[-1:], [1, 12], None, None, None)
+
+def calentar(estado):
+    """Construir las salidas de la vista inicial antes de que las pida un usuario"""
+    filtros = filtros_iniciales(estado)
+    for nombre in CONSTRUCTORES:
+        if nombre == 'tabla-matriz':
+            construir_salida(nombre, estado, filtros, 'Categoría')
+        else:
+            construir_salida(nombre, estado, filtros)
+
+@medir
+def recargar_datos():
+    """Reconstruir la instantánea desde el libro fuera del camino de las solicitudes
+    
+    La carga, el cubo, el índice y los gastos del directorio de entrada se
+    preparan sin bloquear; sólo el reemplazo final toma el bloqueo. Los
+    archivos que lleguen mientras tanto los incorpora la ingesta en su
+    siguiente revisión.
+    """
+    nueva = cargar_instantanea(0)
+    lotes = leer_directorio_entrada()
+    if lotes:
+        nueva = aplicar_lotes(nueva, lotes)
+    with bloqueo_datos:
+        publicar(nueva.reemplazar(version=datos.version + 1))
+        nueva = datos
+    archivar_archivos(nueva.archivos_aplicados)
+    calentar(nueva)
+    return nueva.version
+
+def vigilar_origen():
+    """Calentar la vista inicial y recargar el libro cuando cambia (hilo en segundo plano)"""
+    try:
+        calentar(asegurar_datos())
+    except Exception:
+        server.logger.exception('Error al calentar la vista inicial')
+    while True:
+        time.sleep(INTERVALO_RECARGA)
+        try:
+            if huella_origen() != datos.origen:
+                recargar_datos()
+        except Exception:
+            server.logger.exception('Error al recargar los datos')
+
+if INTERVALO_RECARGA > 0:
+    threading.Thread(target=vigilar_origen, name='recarga-datos', daemon=True).start()
+
+# Marcador liviano mientras llega cada gráfico
+FIGURA_VACIA = {'layout': {'paper_bgcolor': '#13121D', 'plot_bgcolor': '#13121D',
+                           'xaxis': {'visible': False}, 'yaxis': {'visible': False}}}
+
+def crear_layout():
+    """Construir el layout en cada carga de página, sólo con marcadores
+    
+    Cada gráfico y la tabla se completan con su propio callback después del
+    primer pintado, de modo que llegan en paralelo e independientes.
+    """
+    estado = datos
+    # Dash valida el layout en la primera solicitud antes que esperar_datos,
+    # aunque sea /salud: sin datos todavía se devuelve un marcador
+    if estado is None:
+        return html.Div(html.H1('Cargando datos...', className='dashboard-title'), className='dashboard')
+    años_disponibles = listar_años(estado.cubo)
+    departamentos_disponibles = sorted(estado.cubo['Departamento'].dropna().unique().tolist())
+    categorias_disponibles = sorted(estado.cubo['Categoría'].dropna().unique().tolist())
+    cuentas_disponibles = estado.cubo[['Cuenta', 'Categoría']].drop_duplicates().sort_values('Cuenta')
+    
+    return html.Div([
+        # Header
+        html.Div([
+            html.H1(f'Dashboard de Análisis de Gastos del Área de {departamentos_disponibles[0]}'
+                    if len(departamentos_disponibles) == 1 else 'Dashboard de Análisis de Gastos',
+                    className='dashboard-title'),
+            html.Div(describir_periodo(estado.cubo, *filtros_iniciales(estado)[:2]), id='subtitulo-periodo',
+                     className='dashboard-subtitle')
+        ], className='header'),
+    
+        # Huella de los datos mostrados; el intervalo detecta gastos nuevos
+        dcc.Store(id='version-datos', data=identificar_datos(estado)),
+        dcc.Interval(id='intervalo-datos', interval=INTERVALO_ENTRADA * 1000),
+    
+        # Filtros
         html.Div([
-            # Columna izquierda - Velocímetro
             html.Div([
-                dcc.Graph(
-                    id='velocimetro',
-                    figure=crear_grafico_velocimetro(total_gastado, total_presupuesto),
-                    className='gauge-chart',
-                    config={'displayModeBar': False, 'responsive': True},
-                    style={'height': '120px', 'width': '50%'}
+                html.Label('Año', className='filter-label'),
+                dcc.Dropdown(
+                    id='filtro-anio',
+                    options=[{'label': str(año), 'value': año} for año in años_disponibles],
+                    value=años_disponibles[-1:],
+                    multi=True,
+                    placeholder='Todos',
+                    className='filter-dropdown'
                 )
-            ], className='metric-card-large gauge-container'),
-            
-            # Columnas de métricas - mismo tamaño que el velocímetro
-            html.Div([
-                html.Img(src='/assets/Images/percentage-icon.png', className='metric-icon'),
-                html.H2(f'{porcentaje_gasto:.1f} %', className='metric-value'),
-                html.P('% DE GASTO', className='metric-label')
-            ], className='metric-card-large'),
-            
-            html.Div([
-                html.Img(src='/assets/Images/budget-icon.png', className='metric-icon'),
-                html.H2(f'{saldo:,.0f}', className='metric-value'),
-                html.P('SALDO', className='metric-label')
-            ], className='metric-card-large'),
-            
-            html.Div([
-                html.Img(src='/assets/Images/money-icon.png', className='metric-icon'),
-                html.H2(f'{total_presupuesto:,.0f}', className='metric-value'),
-                html.P('TOTAL PRESUPUESTO', className='metric-label')
-            ], className='metric-card-large')
-        ], className='top-section'),
+            ], className='filter-item'),
         
-        # Segunda fila - Gráficos principales
-        html.Div([
-            # Gráfico de barras - Total por categoría
             html.Div([
-                html.H3('Total Gastado por Categoría', className='chart-title'),
-                dcc.Graph(
-                    id='grafico-categorias',
-                    figure=crear_grafico_barras_categoria(df_consolidado)
+                html.Label('Meses', className='filter-label'),
+                dcc.RangeSlider(
+                    id='filtro-meses',
+                    min=1,
+                    max=12,
+                    step=1,
+                    value=[1, 12],
+                    marks={i: mes[:3] for i, mes in enumerate(MESES, start=1)},
+                    allowCross=False
                 )
-            ], className='chart-container col-3'),
-            
-            # Gráfico de líneas - Total por mes
+            ], className='filter-item filter-item-wide'),
+        
             html.Div([
-                html.H3('Total Gastado por Mes', className='chart-title'),
-                dcc.Graph(
-                    id='grafico-meses',
-                    figure=crear_grafico_lineas_mes(df_consolidado)
+                html.Label('Departamento', className='filter-label'),
+                dcc.Dropdown(
+                    id='filtro-departamento',
+                    options=[{'label': departamento, 'value': departamento}
+                             for departamento in departamentos_disponibles],
+                    multi=True,
+                    placeholder='Todos',
+                    className='filter-dropdown'
                 )
-            ], className='chart-container col-4'),
-            
-            # Gráfico de anillo - Por semestre
+            ], className='filter-item'),
+        
             html.Div([
-                html.H3('Total Gastado por Semestre', className='chart-title'),
-                dcc.Graph(
-                    id='grafico-semestre',
-                    figure=crear_grafico_anillo_semestre(df_consolidado)
+                html.Label('Categoría', className='filter-label'),
+                dcc.Dropdown(
+                    id='filtro-categoria',
+                    options=[{'label': categoria, 'value': categoria} for categoria in categorias_disponibles],
+                    multi=True,
+                    placeholder='Todas',
+                    className='filter-dropdown'
                 )
-            ], className='chart-container col-2')
-        ], className='middle-section'),
+            ], className='filter-item'),
         
-        # Tercera fila - Tabla y gráficos
-        html.Div([
-            # Tabla matriz
             html.Div([
-                html.H3('Detalle por Categoría', className='chart-title'),
-                html.Div(
-                    id='tabla-matriz',
-                    children=crear_tabla_matriz(df_consolidado)
+                html.Label('Cuenta', className='filter-label'),
+                dcc.Dropdown(
+                    id='filtro-cuenta',
+                    options=[{'label': f'{fila.Cuenta} - {fila.Categoría}', 'value': fila.Cuenta}
+                             for fila in cuentas_disponibles.itertuples()],
+                    multi=True,
+                    placeholder='Todas',
+                    className='filter-dropdown'
                 )
-            ], className='table-container'),
+            ], className='filter-item')
+        ], className='filters-section'),
+    
+        # Contenedor principal
+        html.Div([
+            # Fila superior con métricas principales
+            html.Div([
+                # Columna izquierda - Velocímetro
+                html.Div([
+                    dcc.Graph(
+                        id='velocimetro',
+                        figure=FIGURA_VACIA,
+                        className='gauge-chart',
+                        config={'displayModeBar': False, 'responsive': True},
+                        style={'height': '120px', 'width': '50%'}
+                    )
+                ], className='metric-card-large gauge-container'),
+            
+                # Columnas de métricas - mismo tamaño que el velocímetro
+                html.Div([
+                    html.Img(src='/assets/Images/percentage-icon.png', className='metric-icon'),
+                    html.H2('-', id='metrica-porcentaje', className='metric-value'),
+                    html.P('% DE GASTO', className='metric-label')
+                ], className='metric-card-large'),
+            
+                html.Div([
+                    html.Img(src='/assets/Images/budget-icon.png', className='metric-icon'),
+                    html.H2('-', id='metrica-saldo', className='metric-value'),
+                    html.P('SALDO', className='metric-label')
+                ], className='metric-card-large'),
             
-            # Contenedor para los dos gráficos del lado derecho
+                html.Div([
+                    html.Img(src='/assets/Images/money-icon.png', className='metric-icon'),
+                    html.H2('-', id='metrica-presupuesto', className='metric-value'),
+                    html.P('TOTAL PRESUPUESTO', className='metric-label')
+                ], className='metric-card-large')
+            ], className='top-section'),
+        
+            # Segunda fila - Gráficos principales
             html.Div([
-                # Gráfico de columnas - Por trimestre
+                # Gráfico de barras - Total por categoría
                 html.Div([
-                    html.H3('Total Gastado por Trimestre', className='chart-title'),
+                    html.H3('Total Gastado por Categoría', className='chart-title'),
                     dcc.Graph(
-                        id='grafico-trimestre',
-                        figure=crear_grafico_columnas_trimestre(df_consolidado),
-                        config={'displayModeBar': False}
+                        id='grafico-categorias',
+                        figure=FIGURA_VACIA
                     )
-                ], className='chart-container-half'),
-                
-                # Nuevo gráfico de radar - Eficiencia del presupuesto
+                ], className='chart-container col-3'),
+            
+                # Gráfico de líneas - Total por mes
                 html.Div([
-                    html.H3('Eficiencia del Presupuesto', className='chart-title'),
+                    html.H3('Total Gastado por Mes', className='chart-title'),
                     dcc.Graph(
-                        id='grafico-radar',
-                        figure=crear_grafico_radar_eficiencia(df_consolidado),
-                        config={'displayModeBar': False}
+                        id='grafico-meses',
+                        figure=FIGURA_VACIA
+                    )
+                ], className='chart-container col-4'),
+            
+                # Gráfico de anillo - Por semestre
+                html.Div([
+                    html.H3('Total Gastado por Semestre', className='chart-title'),
+                    dcc.Graph(
+                        id='grafico-semestre',
+                        figure=FIGURA_VACIA
+                    )
+                ], className='chart-container col-2')
+            ], className='middle-section'),
+        
+            # Tercera fila - Tabla y gráficos
+            html.Div([
+                # Tabla matriz
+                html.Div([
+                    html.H3('Detalle por Categoría', className='chart-title'),
+                    dcc.RadioItems(
+                        id='tabla-nivel',
+                        options=[{'label': 'Categoría', 'value': 'Categoría'},
+                                 {'label': 'Cuenta', 'value': 'Cuenta'}],
+                        value='Categoría',
+                        inline=True,
+                        className='table-level-selector'
+                    ),
+                    html.Div(
+                        id='tabla-matriz',
+                        children=None
                     )
-                ], className='chart-container-half')
-            ], className='right-charts-container')
-        ], className='bottom-section')
-    ], className='main-container')
-], className='dashboard')
+                ], className='table-container'),
+            
+                # Contenedor para los dos gráficos del lado derecho
+                html.Div([
+                    # Gráfico de columnas - Por trimestre
+                    html.Div([
+                        html.H3('Total Gastado por Trimestre', className='chart-title'),
+                        dcc.Graph(
+                            id='grafico-trimestre',
+                            figure=FIGURA_VACIA,
+                            config={'displayModeBar': False}
+                        )
+                    ], className='chart-container-half'),
+                
+                    # Nuevo gráfico de radar - Eficiencia del presupuesto
+                    html.Div([
+                        html.H3('Eficiencia del Presupuesto', className='chart-title'),
+                        dcc.Graph(
+                            id='grafico-radar',
+                            figure=FIGURA_VACIA,
+                            config={'displayModeBar': False}
+                        )
+                    ], className='chart-container-half')
+                ], className='right-charts-container')
+            ], className='bottom-section'),
+            
+            # Cuarta fila - Detalle de la categoría o cuenta seleccionada
+            dcc.Store(id='seleccion-detalle'),
+            html.Div([
+                html.H3('Seleccione una categoría o una fila de la tabla para ver su detalle',
+                        id='titulo-detalle', className='chart-title'),
+                dcc.Graph(
+                    id='grafico-detalle',
+                    figure=FIGURA_VACIA
+                ),
+                crear_tabla_detalle()
+            ], className='table-container detail-section')
+        ], className='main-container')
+    ], className='dashboard')
+
+# Layout de la aplicación
+app.layout = crear_layout
+
+# Entradas comunes a todos los componentes: filtros y versión de los datos
+FILTROS = [Input('filtro-anio', 'value'),
+           Input('filtro-meses', 'value'),
+           Input('filtro-categoria', 'value'),
+           Input('filtro-cuenta', 'value'),
+           Input('filtro-departamento', 'value'),
+           Input('version-datos', 'data')]
+
+@app.callback(
+    [Output('velocimetro', 'figure'),
+     Output('metrica-porcentaje', 'children'),
+     Output('metrica-saldo', 'children'),
+     Output('metrica-presupuesto', 'children')],
+    FILTROS
+)
+@medir
+def actualizar_velocimetro(años, meses, categorias, cuentas, departamentos, version):
+    return construir_salida('velocimetro', datos,
+                            normalizar_filtros(años, meses, categorias, cuentas, departamentos))
+
+@app.callback(
+    Output('tabla-matriz', 'children'),
+    FILTROS + [Input('tabla-nivel', 'value')]
+)
+@medir
+def actualizar_tabla(años, meses, categorias, cuentas, departamentos, version, nivel):
+    return construir_salida('tabla-matriz', datos,
+                            normalizar_filtros(años, meses, categorias, cuentas, departamentos), nivel)
+
+def registrar_grafico(componente):
+    """Registrar el callback que completa un gráfico de forma independiente"""
+    @app.callback(Output(componente, 'figure'), FILTROS)
+    @medir(nombre=f'actualizar_{componente}')
+    def actualizar_grafico(años, meses, categorias, cuentas, departamentos, version):
+        return construir_salida(componente, datos,
+                                normalizar_filtros(años, meses, categorias, cuentas, departamentos))
+
+for componente in ['grafico-categorias', 'grafico-meses', 'grafico-semestre',
+                   'grafico-trimestre', 'grafico-radar']:
+    registrar_grafico(componente)
+
+# El subtítulo describe el período de los filtros de años y meses
+@app.callback(
+    Output('subtitulo-periodo', 'children'),
+    [Input('filtro-anio', 'value'),
+     Input('filtro-meses', 'value'),
+     Input('version-datos', 'data')]
+)
+def actualizar_subtitulo(años, meses, version):
+    años, meses, *_ = normalizar_filtros(años, meses, None, None, None)
+    return describir_periodo(datos.cubo, años, meses)
+
+# Detectar una nueva versión de los datos sin recargar la página
+@app.callback(
+    Output('version-datos', 'data'),
+    Input('intervalo-datos', 'n_intervals'),
+    State('version-datos', 'data')
+)
+def detectar_version(n_intervals, huella):
+    # Se compara la huella del contenido, igual en todos los workers: el
+    # número de versión es local a cada proceso y cambiaría en cada sondeo
+    nueva = identificar_datos(datos)
+    if nueva == huella:
+        raise PreventUpdate
+    return nueva
+
+# Paginación en el servidor de la tabla matriz cuando supera LIMITE_FILAS_HTML
+@app.callback(
+    Output('tabla-matriz-datos', 'data'),
+    Input('tabla-matriz-datos', 'page_current'),
+    [State('filtro-anio', 'value'),
+     State('filtro-meses', 'value'),
+     State('filtro-categoria', 'value'),
+     State('filtro-cuenta', 'value'),
+     State('filtro-departamento', 'value'),
+     State('tabla-nivel', 'value')],
+    prevent_initial_call=True
+)
+@medir
+def paginar_matriz(pagina, años, meses, categorias, cuentas, departamentos, nivel):
+    df_tabla = construir_tabla(datos, *normalizar_filtros(años, meses, categorias, cuentas, departamentos), nivel)
+    return paginar_tabla(df_tabla, pagina or 0)
+
+# Selección del detalle: una barra del gráfico de categorías o una fila de la tabla
+def _seleccion(etiqueta, nivel):
+    """Convertir la etiqueta de una fila ('cuenta - categoría' en el nivel Cuenta) en la selección"""
+    if nivel == 'Cuenta':
+        cuenta, _, categoria = etiqueta.partition(' - ')
+        return {'categoria': categoria, 'cuenta': int(cuenta)}
+    return {'categoria': etiqueta, 'cuenta': None}
+
+@app.callback(
+    Output('seleccion-detalle', 'data', allow_duplicate=True),
+    Input('grafico-categorias', 'clickData'),
+    prevent_initial_call=True
+)
+def seleccionar_categoria(click):
+    if not click:
+        raise PreventUpdate
+    return _seleccion(click['points'][0]['y'], 'Categoría')
+
+@app.callback(
+    Output('seleccion-detalle', 'data', allow_duplicate=True),
+    Input({'type': 'fila-matriz', 'index': ALL}, 'n_clicks'),
+    State('tabla-nivel', 'value'),
+    prevent_initial_call=True
+)
+def seleccionar_fila(clics, nivel):
+    # Las filas recién creadas llegan con n_clicks=0 y no son un clic
+    if not dash.ctx.triggered_id or not any(disparo['value'] for disparo in dash.ctx.triggered):
+        raise PreventUpdate
+    return _seleccion(dash.ctx.triggered_id['index'], nivel)
+
+@app.callback(
+    Output('seleccion-detalle', 'data', allow_duplicate=True),
+    Input('tabla-matriz-datos', 'active_cell'),
+    [State('tabla-matriz-datos', 'data'),
+     State('tabla-nivel', 'value')],
+    prevent_initial_call=True
+)
+def seleccionar_celda(celda, filas, nivel):
+    if not celda:
+        raise PreventUpdate
+    return _seleccion(filas[celda['row']]['Etiqueta'], nivel)
 
-# Callback para actualizar el dashboard (si necesitas interactividad futura)
 @app.callback(
-    Output('velocimetro', 'figure'),
-    Input('velocimetro', 'id')
+    [Output('titulo-detalle', 'children'),
+     Output('grafico-detalle', 'figure'),
+     Output('tabla-detalle', 'data'),
+     Output('tabla-detalle', 'page_count'),
+     Output('tabla-detalle', 'page_current')],
+    [Input('seleccion-detalle', 'data')] + FILTROS,
+    prevent_initial_call=True
 )
-def update_gauge(id):
-    return crear_grafico_velocimetro(total_gastado, total_presupuesto)
+@medir
+def actualizar_detalle(seleccion, años, meses, categorias, cuentas, departamentos, version):
+    if not seleccion:
+        raise PreventUpdate
+    estado = datos
+    detalle = construir_detalle(estado, (seleccion['categoria'], seleccion['cuenta']),
+                                *normalizar_filtros(años, meses, categorias, cuentas, departamentos))
+    posiciones = detalle['posiciones']
+    titulo = (f"Detalle de la Cuenta {seleccion['cuenta']} - {seleccion['categoria']}"
+              if seleccion['cuenta'] is not None else f"Detalle de {seleccion['categoria']}")
+    return (
+        f'{titulo} ({len(posiciones):,} gastos)',
+        detalle['figura'],
+        paginar_detalle(estado.df_consolidado, posiciones, 0),
+        max(-(-len(posiciones) // FILAS_POR_PAGINA), 1),
+        0
+    )
+
+# Paginación en el servidor del detalle: sólo viaja la página visible
+@app.callback(
+    Output('tabla-detalle', 'data', allow_duplicate=True),
+    Input('tabla-detalle', 'page_current'),
+    [State('seleccion-detalle', 'data'),
+     State('filtro-anio', 'value'),
+     State('filtro-meses', 'value'),
+     State('filtro-categoria', 'value'),
+     State('filtro-cuenta', 'value'),
+     State('filtro-departamento', 'value')],
+    prevent_initial_call=True
+)
+@medir
+def paginar_detalle_gastos(pagina, seleccion, años, meses, categorias, cuentas, departamentos):
+    if not seleccion:
+        raise PreventUpdate
+    estado = datos
+    detalle = construir_detalle(estado, (seleccion['categoria'], seleccion['cuenta']),
+                                *normalizar_filtros(años, meses, categorias, cuentas, departamentos))
+    return paginar_detalle(estado.df_consolidado, detalle['posiciones'], pagina or 0)
+
+# Alta de gastos nuevos por HTTP: se escriben al directorio de entrada para
+# que todos los workers los incorporen, y este los aplica de inmediato
+@server.route('/api/gastos', methods=['POST'])
+def recibir_gastos():
+    filas = request.get_json(silent=True)
+    if not isinstance(filas, list) or not filas:
+        return jsonify({'error': 'Se esperaba una lista de filas con Fecha, Cuenta y Gastos'}), 400
+    # Se valida todo (también la fecha) antes de escribir el archivo
+    try:
+        df_nuevos = normalizar_gastos_nuevos(pd.DataFrame(filas))
+    except (KeyError, ValueError, TypeError):
+        return jsonify({'error': 'Se esperaba una lista de filas con Fecha, Cuenta y Gastos válidos'}), 400
+    
+    os.makedirs(DIRECTORIO_ENTRADA, exist_ok=True)
+    nombre = f'{time.strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}.csv'
+    temporal = os.path.join(DIRECTORIO_ENTRADA, f'.{nombre}.tmp')
+    df_nuevos.to_csv(temporal, index=False)
+    os.replace(temporal, os.path.join(DIRECTORIO_ENTRADA, nombre))
+    version = agregar_gastos([(nombre, df_nuevos)])
+    if nombre not in datos.archivos_aplicados:
+        return jsonify({'error': 'No se pudieron incorporar los gastos'}), 422
+    return jsonify({'filas': len(df_nuevos), 'version': version}), 201
+
+def filtros_desde_consulta(argumentos):
+    """Leer los filtros del dashboard desde los parámetros de una URL
+    
+    anio, departamento, categoria y cuenta son listas separadas por comas y
+    meses un rango 'inicio-fin'. Lanza ValueError si un valor no es válido.
+    """
+    def _lista(nombre, tipo=str):
+        valor = argumentos.get(nombre)
+        return [tipo(elemento) for elemento in valor.split(',') if elemento] if valor else None
+    
+    meses = argumentos.get('meses')
+    if meses:
+        inicio, _, fin = meses.partition('-')
+        meses = [int(inicio), int(fin or inicio)]
+    return normalizar_filtros(_lista('anio', int), meses, _lista('categoria'),
+                              _lista('cuenta', int), _lista('departamento'))
+
+def _reporte_matriz(estado, filtros, nivel):
+    df_tabla = construir_tabla(estado, *filtros, nivel)
+    claves = ['Categoría'] if nivel == 'Categoría' else ['Cuenta', 'Categoría']
+    return df_tabla[claves + COLUMNAS_TABLA[1:] + COLUMNAS_PRONOSTICO]
+
+def _reporte_eficiencia(estado, filtros, nivel):
+    agregados = preparar_vista(estado, *filtros)
+    return resumir_eficiencia(agregados['vista'], agregados['presupuesto'], agregados['pronostico'])
+
+def _reporte_pronostico(estado, filtros, nivel):
+    años, _, categorias, cuentas, departamentos = filtros
+    return filtrar_pronostico(pronostico_datos(estado), años, categorias, cuentas, departamentos)
+
+# Reportes exportables, todos calculados desde los agregados en caché
+REPORTES = {
+    'matriz': _reporte_matriz,
+    'mensual': lambda estado, filtros, nivel: resumir_periodos(
+        preparar_vista(estado, *filtros)['df_mensual'], 'Mes'),
+    'trimestral': lambda estado, filtros, nivel: resumir_periodos(
+        preparar_vista(estado, *filtros)['df_mensual'], 'Trimestre'),
+    'semestral': lambda estado, filtros, nivel: resumir_periodos(
+        preparar_vista(estado, *filtros)['df_mensual'], 'Semestre'),
+    'eficiencia': _reporte_eficiencia,
+    'pronostico': _reporte_pronostico
+}
+
+# Exportación de reportes en CSV, Parquet o XLSX; el archivo se genera y se
+# envía por bloques, sin armarlo completo en memoria
+@server.route('/api/exportar/<reporte>')
+def exportar_reporte(reporte):
+    formato = request.args.get('formato', 'csv')
+    nivel = request.args.get('nivel', 'Categoría')
+    if reporte not in REPORTES:
+        return jsonify({'error': f'Reporte desconocido; disponibles: {", ".join(REPORTES)}'}), 404
+    if not formato_disponible(formato):
+        return jsonify({'error': f'Formato no disponible: {formato}'}), 400
+    if nivel not in ('Categoría', 'Cuenta'):
+        return jsonify({'error': 'nivel debe ser Categoría o Cuenta'}), 400
+    try:
+        filtros = filtros_desde_consulta(request.args)
+    except ValueError:
+        return jsonify({'error': 'Filtros inválidos'}), 400
+    
+    estado = datos
+    df_reporte = REPORTES[reporte](estado, filtros, nivel)
+    return Response(
+        exportar(df_reporte, formato, reporte),
+        mimetype=TIPOS_MIME[formato],
+        headers={'Content-Disposition': f'attachment; filename={reporte}-v{estado.version}.{formato}'}
+    )
+
+# Claves por las que se puede unir el presupuesto a un agregado
+CLAVES_PRESUPUESTO = {'Departamento', 'Categoría', 'Cuenta'}
+
+@lru_cache(maxsize=256)
+@medir
+def construir_agregado(estado, filtros, por):
+    """Filas JSON de una consulta de agregados: filtros sobre el cubo y luego agrupación"""
+    vista, presupuesto = filtrar_vista(estado, *filtros)
+    if not set(por) <= CLAVES_PRESUPUESTO:
+        presupuesto = None
+    return resumir_cubo(vista, list(por), presupuesto).to_json(orient='records', force_ascii=False)
+
+@lru_cache(maxsize=8)
+def identificar_datos(estado):
+    """Huella del contenido de una instantánea, igual en todos los workers
+    
+    El número de versión es local a cada proceso; la huella depende sólo del
+    origen y de los archivos de gastos incorporados.
+    """
+    return hashlib.sha1(repr((estado.origen, sorted(estado.archivos_aplicados))).encode()).hexdigest()
+
+# Consulta de agregados en JSON, p. ej. /api/agregados?por=Categoría,Mes&anio=2019;
+# el ETag depende de los datos y de la consulta, y si coincide se responde 304
+@server.route('/api/agregados')
+def consultar_agregados():
+    por = tuple(clave for clave in request.args.get('por', 'Categoría').split(',') if clave)
+    if not por or any(clave not in CLAVES_CUBO for clave in por):
+        return jsonify({'error': f'por debe ser una lista de: {", ".join(CLAVES_CUBO)}'}), 400
+    try:
+        filtros = filtros_desde_consulta(request.args)
+    except ValueError:
+        return jsonify({'error': 'Filtros inválidos'}), 400
+    
+    estado = datos
+    etiqueta = hashlib.sha1(f'{identificar_datos(estado)}{filtros}{por}'.encode()).hexdigest()[:20]
+    if request.if_none_match.contains(etiqueta):
+        respuesta = Response(status=304)
+    else:
+        filas = construir_agregado(estado, filtros, por)
+        respuesta = Response(
+            f'{{"version": {estado.version}, "por": {json.dumps(por, ensure_ascii=False)}, "filas": {filas}}}',
+            mimetype='application/json'
+        )
+    respuesta.set_etag(etiqueta)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+# Reporte de validación del libro cargado (calculado al construir la caché)
+@server.route('/api/validacion')
+def reporte_validacion():
+    estado = datos
+    return jsonify({'version': estado.version, **(estado.validacion or {})})
+
+# Contadores de aciertos/fallos del caché de vistas
+@server.route('/cache')
+def estadisticas_cache():
+    return jsonify({
+        'vistas': preparar_vista.cache_info()._asdict(),
+        'salidas': construir_salida.cache_info()._asdict(),
+        'tablas': construir_tabla.cache_info()._asdict(),
+        'agregados': construir_agregado.cache_info()._asdict(),
+        'detalles': construir_detalle.cache_info()._asdict()
+    })
+
+# Métricas en formato de texto de Prometheus; los histogramas de latencia sólo
+# se llenan con DASHBOARD_INSTRUMENTACION=1, los contadores de caché siempre
+@server.route('/metrics')
+def metricas():
+    texto = instrumentacion.exportar_prometheus(
+        caches={
+            'vistas': preparar_vista.cache_info(),
+            'salidas': construir_salida.cache_info(),
+            'tablas': construir_tabla.cache_info(),
+            'agregados': construir_agregado.cache_info(),
+            'detalles': construir_detalle.cache_info()
+        },
+        indicadores={
+            'dashboard_datos_version': datos.version,
+            'dashboard_datos_filas': len(datos.df_consolidado),
+            'dashboard_consolidado_bytes': int(datos.df_consolidado.memory_usage().sum()),
+            'dashboard_validacion_problemas': (datos.validacion or {}).get('problemas', 0)
+        }
+    )
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+# Vida y disponibilidad por separado: /salud responde apenas el proceso atiende
+# y /listo sólo cuando hay datos cargados (503 mientras tanto)
+RUTAS_SALUD = ('/salud', '/listo')
+
+@server.route('/salud')
+def salud():
+    return jsonify({'estado': 'vivo'})
+
+@server.route('/listo')
+def listo():
+    estado = datos
+    cuerpo = {
+        'listo': estado is not None,
+        'version': estado.version if estado is not None else None,
+        'importaciones': instrumentacion.IMPORTACIONES
+    }
+    return jsonify(cuerpo), 200 if estado is not None else 503
+
+if CARGA_DIFERIDA:
+    @server.before_request
+    def esperar_datos():
+        # Las demás rutas esperan (o disparan) la carga de los datos
+        if request.path not in RUTAS_SALUD:
+            asegurar_datos()
+
+# Cabecera Server-Timing con las etapas medidas en cada solicitud
+if instrumentacion.ACTIVA:
+    @server.before_request
+    def iniciar_medicion():
+        instrumentacion.iniciar_solicitud()
+    
+    @server.after_request
+    def agregar_server_timing(respuesta):
+        tiempos = instrumentacion.terminar_solicitud()
+        if tiempos:
+            respuesta.headers['Server-Timing'] = tiempos
+        return respuesta
 
 if __name__ == '__main__':
 
@@ -0,0 +1,66 @@
+"""Punto de entrada WSGI de arranque rápido: gunicorn arranque:aplicacion
+
+Sólo importa la biblioteca estándar: /salud y /listo responden de inmediato
+mientras pandas, plotly, Dash, la app y los datos se cargan en el primer uso
+o en el calentamiento (precalentar, llamado desde gunicorn.conf.py). El tiempo
+de importación de cada módulo queda en /listo y en /metrics.
+"""
+import json
+import logging
+import os
+import threading
+
+import instrumentacion
+
+logger = logging.getLogger(__name__)
+
+# La app no carga los datos al importarse: lo hace cargar_aplicacion
+os.environ.setdefault('DASHBOARD_CARGA_DIFERIDA', '1')
+
+# Módulos pesados en el orden en que se importan, para medir el costo de cada uno
+MODULOS = ['numpy', 'pandas', 'plotly.graph_objects', 'dash', 'funciones', 'app']
+
+_servidor = None
+_bloqueo = threading.Lock()
+
+def cargar_aplicacion():
+    """Importar los módulos pesados y la app y cargar los datos, una sola vez por proceso"""
+    global _servidor
+    if _servidor is None:
+        with _bloqueo:
+            if _servidor is None:
+                for nombre in MODULOS:
+                    instrumentacion.importar(nombre)
+                logger.info('Importaciones: %s', ', '.join(
+                    f'{nombre} {segundos:.3f}s' for nombre, segundos in instrumentacion.IMPORTACIONES.items()))
+                app = instrumentacion.importar('app')
+                app.asegurar_datos()
+                _servidor = app.server
+    return _servidor
+
+def _precalentar():
+    try:
+        cargar_aplicacion()
+    except Exception:
+        logger.exception('Error al precalentar la aplicación')
+
+def precalentar():
+    """Cargar la aplicación y los datos en segundo plano"""
+    threading.Thread(target=_precalentar, name='precalentar', daemon=True).start()
+
+def _responder(start_response, estado, cuerpo):
+    contenido = json.dumps(cuerpo).encode('utf-8')
+    start_response(estado, [('Content-Type', 'application/json'),
+                            ('Content-Length', str(len(contenido)))])
+    return [contenido]
+
+def aplicacion(environ, start_response):
+    """Responder salud y disponibilidad sin la app; cualquier otra ruta la carga"""
+    if _servidor is None:
+        ruta = environ.get('PATH_INFO', '')
+        if ruta == '/salud':
+            return _responder(start_response, '200 OK', {'estado': 'vivo'})
+        if ruta == '/listo':
+            return _responder(start_response, '503 Service Unavailable',
+                              {'listo': False, 'version': None, 'importaciones': dict(instrumentacion.IMPORTACIONES)})
+    return cargar_aplicacion()(environ, start_response)
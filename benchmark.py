@@ -0,0 +1,207 @@
+"""Benchmark de carga, agregación y renderizado del dashboard.
+
+Genera libros sintéticos con la forma de 'Base de Datos.xlsx' (Gastos,
+Presupuesto, Tabla Calendario), mide cada etapa y emite los resultados en JSON
+para comparar ramas:
+
+    python benchmark.py --filas 1000 100000 --salida rama.json
+    python benchmark.py --filas 1000 100000 --comparar main.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import funciones as f
+
+# Por encima de este tamaño no se escribe .xlsx (límite práctico de openpyxl)
+LIMITE_XLSX = 100_000
+
+# Desaceleración relativa a partir de la cual --comparar falla; las diferencias
+# menores a MINIMO_SEGUNDOS se consideran ruido
+TOLERANCIA = 0.2
+MINIMO_SEGUNDOS = 0.005
+
+def generar_datos(filas, semilla=0):
+    """Generar las tres hojas sintéticas con la misma estructura que el libro real"""
+    rng = np.random.default_rng(semilla)
+    
+    # Una cuenta cada ~1000 filas, con 10 categorías como en el libro real
+    n_cuentas = int(np.clip(filas // 1000, 10, 5000))
+    cuentas = np.arange(310001, 310001 + n_cuentas)
+    categorias = [f'Categoría {i}' for i in range(1, 11)]
+    df_presupuesto = pd.DataFrame({
+        'cuenta': cuentas,
+        'Categoría': [categorias[i % 10] for i in range(n_cuentas)],
+        'Presupuesto Anual': rng.integers(5, 350, n_cuentas) * 1000
+    })
+    
+    fechas = pd.date_range('2018-01-01', '2022-12-31', freq='D')
+    df_calendario = pd.concat(
+        [pd.DataFrame({'Fecha': fechas}), f.derivar_calendario(pd.Series(fechas))],
+        axis=1
+    ).astype({'Mes': str, 'Trimestre': str, 'Semestre': str, 'Mes Num': 'int64', 'Año': 'int64'})
+    
+    df_gastos = pd.DataFrame({
+        'Fecha': pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.integers(0, 243, filas), 'D'),
+        'Cuenta': rng.choice(cuentas, filas),
+        'Gastos': rng.integers(100, 40000, filas)
+    })
+    return df_gastos, df_presupuesto, df_calendario
+
+def escribir_libro(ruta, df_gastos, df_presupuesto, df_calendario):
+    with pd.ExcelWriter(ruta, engine='openpyxl') as escritor:
+        df_gastos.to_excel(escritor, sheet_name='Gastos', index=False)
+        df_presupuesto.to_excel(escritor, sheet_name='Presupuesto', index=False)
+        df_calendario.to_excel(escritor, sheet_name='Tabla Calendario', index=False)
+
+def escribir_parquet(carpeta, df_gastos, df_presupuesto, df_calendario):
+    rutas = {}
+    for nombre, df in zip(f.HOJAS, (df_gastos, df_presupuesto, df_calendario)):
+        rutas[nombre] = os.path.join(carpeta, f'{nombre}.parquet')
+        df.to_parquet(rutas[nombre], index=False)
+    return rutas
+
+def medir(funcion, *args, repeticiones=1):
+    """Ejecutar una función y devolver (resultado, mediciones)
+    
+    Una primera ejecución mide el pico de memoria con tracemalloc (incluye los
+    buffers de NumPy); el tiempo es el mínimo de las repeticiones sin trazar.
+    """
+    tracemalloc.start()
+    resultado = funcion(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, {'segundos': min(tiempos), 'pico_bytes': pico}
+
+def medir_tamano(filas, repeticiones, carpeta):
+    """Medir todas las etapas para un tamaño de libro"""
+    resultados = {}
+    hojas = generar_datos(filas)
+    
+    # Carga: desde Excel (en frío y desde caché) o desde Parquet en tamaños grandes
+    if filas <= LIMITE_XLSX:
+        ruta = os.path.join(carpeta, f'libro_{filas}.xlsx')
+        ruta_cache = os.path.join(carpeta, f'cache_{filas}')
+        escribir_libro(ruta, *hojas)
+        
+        # Cada carga en frío usa una caché nueva para forzar el parseo del Excel
+        datos, resultados['cargar_datos_frio'] = medir(
+            lambda: f.cargar_datos(ruta, tempfile.mkdtemp(dir=carpeta)))
+        f.cargar_datos(ruta, ruta_cache)
+        datos, resultados['cargar_datos_cache'] = medir(
+            f.cargar_datos, ruta, ruta_cache, repeticiones=repeticiones)
+        datos, resultados['cargar_datos_compartido'] = medir(
+            lambda: f.cargar_datos(ruta, ruta_cache, compartido=True), repeticiones=repeticiones)
+        origen = 'xlsx'
+    else:
+        try:
+            rutas = escribir_parquet(carpeta, *hojas)
+            _, resultados['leer_parquet'] = medir(
+                lambda: [pd.read_parquet(rutas[nombre]) for nombre in f.HOJAS])
+            origen = 'parquet'
+        except ImportError:
+            origen = 'memoria'
+        datos, resultados['procesar_datos'] = medir(
+            lambda: f.procesar_datos(*(df.copy() for df in hojas)))
+    
+    _, resultados['validar_datos'] = medir(f.validar_datos, *datos, repeticiones=repeticiones)
+    df_gastos, df_presupuesto, df_calendario, df_consolidado = datos
+    indice, resultados['construir_indice_presupuesto'] = medir(
+        f.construir_indice_presupuesto, df_presupuesto, repeticiones=repeticiones)
+    cubo, resultados['construir_cubo'] = medir(
+        f.construir_cubo, df_consolidado, repeticiones=repeticiones)
+    metricas, resultados['calcular_metricas'] = medir(
+        f.calcular_metricas, cubo, indice, repeticiones=repeticiones)
+    df_mensual, resultados['agregar_por_mes'] = medir(
+        f.agregar_por_mes, cubo, repeticiones=repeticiones)
+    
+    total_gastado, total_presupuesto = metricas[0], metricas[1]
+    constructores = {
+        'crear_grafico_velocimetro': (total_gastado, total_presupuesto),
+        'crear_grafico_barras_categoria': (cubo,),
+        'crear_grafico_lineas_mes': (df_mensual,),
+        'crear_grafico_anillo_semestre': (df_mensual, total_presupuesto),
+        'crear_grafico_columnas_trimestre': (df_mensual,),
+        'crear_grafico_radar_eficiencia': (cubo, indice),
+        'crear_tabla_matriz': (cubo, indice),
+    }
+    for nombre, args in constructores.items():
+        _, resultados[nombre] = medir(getattr(f, nombre), *args, repeticiones=repeticiones)
+    _, resultados['crear_tabla_matriz_cuenta'] = medir(
+        f.crear_tabla_matriz, cubo, indice, 'Cuenta', repeticiones=repeticiones)
+    
+    return {
+        'filas': filas,
+        'origen': origen,
+        'filas_cubo': len(cubo),
+        'bytes_consolidado': int(df_consolidado.memory_usage(deep=True).sum()),
+        'etapas': resultados
+    }
+
+def comparar(actual, base, tolerancia=TOLERANCIA):
+    """Comparar dos ejecuciones y devolver las etapas que se volvieron más lentas"""
+    base_por_filas = {r['filas']: r for r in base['resultados']}
+    lentas = []
+    for resultado in actual['resultados']:
+        anterior = base_por_filas.get(resultado['filas'])
+        if anterior is None:
+            continue
+        for etapa, medicion in resultado['etapas'].items():
+            referencia = anterior['etapas'].get(etapa)
+            if not referencia or not referencia['segundos']:
+                continue
+            cambio = medicion['segundos'] / referencia['segundos'] - 1
+            print(f"{resultado['filas']:>10} {etapa:<36} {referencia['segundos']:>9.4f}s "
+                  f"-> {medicion['segundos']:>9.4f}s ({cambio:+.0%})", file=sys.stderr)
+            if cambio > tolerancia and medicion['segundos'] - referencia['segundos'] > MINIMO_SEGUNDOS:
+                lentas.append((resultado['filas'], etapa, cambio))
+    return lentas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, nargs='+', default=[1_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--salida', help='archivo JSON de resultados (por defecto stdout)')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    args = parser.parse_args(argv)
+    
+    with tempfile.TemporaryDirectory() as carpeta:
+        ejecucion = {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'resultados': [medir_tamano(filas, args.repeticiones, carpeta) for filas in args.filas]
+        }
+    
+    contenido = json.dumps(ejecucion, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            archivo.write(contenido)
+    else:
+        print(contenido)
+    
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            lentas = comparar(ejecucion, json.load(archivo), args.tolerancia)
+        for filas, etapa, cambio in lentas:
+            print(f'Regresión: {etapa} con {filas} filas ({cambio:+.0%})', file=sys.stderr)
+        return 1 if lentas else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
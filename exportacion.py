@@ -0,0 +1,87 @@
+import io
+import os
+import tempfile
+
+# Filas por bloque al generar los archivos: acota la memoria de cada paso
+FILAS_POR_BLOQUE = 10_000
+
+# Tamaño de las partes en que se envía un archivo ya escrito en disco
+BYTES_POR_PARTE = 1 << 20
+
+TIPOS_MIME = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+def _bloques(df, filas_por_bloque=FILAS_POR_BLOQUE):
+    for inicio in range(0, len(df), filas_por_bloque):
+        yield df.iloc[inicio:inicio + filas_por_bloque]
+
+def exportar_csv(df):
+    """Generar el CSV por bloques: la cabecera y luego cada bloque de filas"""
+    yield df.iloc[:0].to_csv(index=False)
+    for bloque in _bloques(df):
+        yield bloque.to_csv(index=False, header=False)
+
+def exportar_parquet(df):
+    """Generar el Parquet con un grupo de filas por bloque (requiere pyarrow)
+    
+    Cada grupo se envía apenas se escribe, así sólo un bloque vive en memoria.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    buffer = io.BytesIO()
+    esquema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(buffer, esquema) as escritor:
+        for bloque in _bloques(df):
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def exportar_xlsx(df, hoja='Datos'):
+    """Generar el XLSX escribiendo fila a fila a un archivo temporal y enviándolo por partes
+    
+    openpyxl en modo write_only no guarda las filas en memoria; el zip final
+    se arma en disco y se transmite en partes de BYTES_POR_PARTE.
+    """
+    from openpyxl import Workbook
+    
+    libro = Workbook(write_only=True)
+    hoja_datos = libro.create_sheet(hoja)
+    hoja_datos.append([str(columna) for columna in df.columns])
+    for bloque in _bloques(df):
+        for fila in bloque.itertuples(index=False):
+            hoja_datos.append([None if valor != valor else valor for valor in fila])
+    
+    descriptor, ruta = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descriptor)
+    try:
+        libro.save(ruta)
+        with open(ruta, 'rb') as archivo:
+            for parte in iter(lambda: archivo.read(BYTES_POR_PARTE), b''):
+                yield parte
+    finally:
+        os.remove(ruta)
+
+def formato_disponible(formato):
+    """Indicar si el formato está soportado y sus dependencias instaladas"""
+    if formato == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return False
+    return formato in TIPOS_MIME
+
+def exportar(df, formato, hoja='Datos'):
+    """Generador con el contenido del reporte en el formato pedido"""
+    if formato == 'csv':
+        return exportar_csv(df)
+    if formato == 'parquet':
+        return exportar_parquet(df)
+    if formato == 'xlsx':
+        return exportar_xlsx(df, hoja)
+    raise ValueError(f'Formato de exportación desconocido: {formato}')
@@ -1,60 +1,941 @@
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
-from dash import html
+import plotly.io as pio
+from dash import html, dash_table
+from dash.dash_table.Format import Format, Group, Scheme, Symbol
 import numpy as np
-from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 
-def cargar_datos():
-    """Cargar y procesar los datos desde el archivo Excel"""
-    # Cargar las hojas del Excel
-    df_gastos = pd.read_excel('Base de Datos.xlsx', sheet_name='Gastos')
-    df_presupuesto = pd.read_excel('Base de Datos.xlsx', sheet_name='Presupuesto')
-    df_calendario = pd.read_excel('Base de Datos.xlsx', sheet_name='Tabla Calendario')
+from instrumentacion import bloque, medir
+
+logger = logging.getLogger(__name__)
+
+# Rutas del libro de origen y de la caché columnar; el origen puede ser
+# también un directorio de libros con las mismas hojas
+RUTA_EXCEL = 'Base de Datos.xlsx'
+RUTA_ORIGEN = os.environ.get('DASHBOARD_ORIGEN', RUTA_EXCEL)
+RUTA_CACHE = 'cache_datos'
+
+# Lectura en paralelo: procesos del pool y tamaños a partir de los que compensa
+# pagar el arranque de los procesos y el envío de los datos entre ellos
+PROCESOS = int(os.environ.get('DASHBOARD_PROCESOS', '0')) or os.cpu_count() or 1
+MINIMO_BYTES_PARALELO = 2 << 20
+FILAS_POR_LOTE = 1_000_000
+
+# Se incrementa cuando cambia el esquema de las tablas guardadas
+FORMATO_CACHE = 6
+
+COLUMNAS_GASTOS = ['Fecha', 'Cuenta', 'Gastos']
+
+HOJAS = ['Gastos', 'Presupuesto', 'Tabla Calendario']
+TABLAS = ['gastos', 'presupuesto', 'calendario', 'consolidado']
+
+# El consolidado se guarda ordenado por estas claves: cada año y departamento
+# ocupa un tramo contiguo que se puede leer o descartar sin recorrer el resto
+CLAVES_PARTICION = ['Año', 'Departamento']
+
+# Departamento asignado a las cuentas cuando el presupuesto no lo indica
+DEPARTAMENTO_PREDETERMINADO = 'Recursos Humanos'
+
+@medir
+def leer_excel(ruta=RUTA_EXCEL):
+    """Leer las hojas del Excel abriendo el libro una sola vez"""
+    hojas = pd.read_excel(ruta, sheet_name=HOJAS)
+    return hojas['Gastos'], hojas['Presupuesto'], hojas['Tabla Calendario']
+
+def listar_libros(ruta=RUTA_ORIGEN):
+    """Libros .xlsx de un directorio de origen (en orden), o el propio libro"""
+    if not os.path.isdir(ruta):
+        return [ruta]
+    return sorted(
+        os.path.join(ruta, nombre) for nombre in os.listdir(ruta)
+        if nombre.endswith('.xlsx') and not nombre.startswith('~$')
+    )
+
+def leer_hoja(ruta, hoja):
+    """Leer una hoja de un libro, o None si el libro no la tiene"""
+    with pd.ExcelFile(ruta) as libro:
+        if hoja not in libro.sheet_names:
+            return None
+        return libro.parse(hoja)
+
+@medir
+def leer_libros(rutas, ejecutor=None):
+    """Leer y unir las hojas de varios libros
     
-    # Convertir fecha de Excel a datetime si es necesario
-    if df_gastos['Fecha'].dtype == 'int64' or df_gastos['Fecha'].dtype == 'float64':
-        df_gastos['Fecha'] = pd.to_datetime('1899-12-30') + pd.to_timedelta(df_gastos['Fecha'], 'D')
+    Con un ejecutor cada (libro, hoja) se parsea en un proceso distinto. Los
+    gastos se concatenan en el orden de los libros; las hojas de presupuesto y
+    calendario idénticas (repetidas en cada libro) se toman una sola vez.
+    """
+    tareas = [(ruta, hoja) for ruta in rutas for hoja in HOJAS]
+    if ejecutor is None:
+        resultados = [leer_hoja(ruta, hoja) for ruta, hoja in tareas]
     else:
-        df_gastos['Fecha'] = pd.to_datetime(df_gastos['Fecha'])
+        resultados = list(ejecutor.map(leer_hoja, *zip(*tareas)))
     
+    por_hoja = {hoja: [] for hoja in HOJAS}
+    for (_, hoja), df in zip(tareas, resultados):
+        if df is None:
+            continue
+        if hoja != 'Gastos' and any(df.equals(anterior) for anterior in por_hoja[hoja]):
+            continue
+        por_hoja[hoja].append(df)
+    
+    for hoja, partes in por_hoja.items():
+        if not partes:
+            raise ValueError(f"Ningún libro de {rutas} tiene la hoja '{hoja}'")
+    por_hoja['Presupuesto'] = [unir_presupuestos(por_hoja['Presupuesto'])]
+    return tuple(pd.concat(por_hoja[hoja], ignore_index=True) for hoja in HOJAS)
+
+def unir_presupuestos(partes):
+    """Unir las hojas de presupuesto de varios libros sin sumar cuentas repetidas
+    
+    Las filas idénticas en varios libros se toman una sola vez; las filas
+    repetidas dentro de un mismo libro se conservan (se suman como siempre).
+    Una cuenta con filas distintas en más de un libro está en conflicto y se
+    lanza ValueError en lugar de mezclar sus montos o departamentos.
+    """
+    df = pd.concat(partes, keys=range(len(partes)), names=['libro', None]).reset_index(level='libro')
+    columnas = list(df.columns.drop('libro'))
+    primero = df.groupby(columnas, dropna=False)['libro'].transform('first')
+    df = df[df['libro'] == primero]
+    
+    libros = df.groupby('cuenta')['libro'].nunique()
+    conflictos = libros.index[libros > 1].tolist()
+    if conflictos:
+        raise ValueError(f'Cuentas con presupuestos distintos en varios libros: {conflictos[:MUESTRAS_VALIDACION]}')
+    return df.drop(columns='libro').reset_index(drop=True)
+
+def _crear_ejecutor(rutas):
+    """Pool de procesos para leer los libros, o un contexto vacío si no compensa"""
+    tamano = sum(os.path.getsize(ruta) for ruta in rutas)
+    if PROCESOS < 2 or tamano < MINIMO_BYTES_PARALELO:
+        return nullcontext()
+    # fork sólo es seguro mientras el proceso tiene un único hilo: un hijo puede
+    # heredar un lock tomado por otro hilo y bloquearse. La carga inicial ocurre
+    # antes de arrancar los hilos; la recarga en segundo plano lee en serie
+    if threading.active_count() > 1:
+        logger.info('Lectura secuencial de %d libros: el proceso ya tiene otros hilos', len(rutas))
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=PROCESOS)
+
+def _convertir_fechas(serie):
+    """Convertir fechas seriales de Excel (o texto) a datetime"""
+    if serie.dtype == 'int64' or serie.dtype == 'float64':
+        return pd.to_datetime('1899-12-30') + pd.to_timedelta(serie, 'D')
+    return pd.to_datetime(serie, errors='raise')
+
+@medir
+def procesar_datos(df_gastos, df_presupuesto, df_calendario, derivar_fechas=True, años=None, ejecutor=None):
+    """Normalizar las hojas y construir el consolidado
+    
+    Con derivar_fechas las partes de la fecha se calculan directamente en lugar
+    de unir con el calendario, siempre que el calendario lo confirme. Con años
+    sólo se procesan los gastos de esos años. Con un ejecutor los gastos se
+    enriquecen por lotes en paralelo.
+    """
     # Convertir fecha del calendario
-    if df_calendario['Fecha'].dtype == 'int64' or df_calendario['Fecha'].dtype == 'float64':
-        df_calendario['Fecha'] = pd.to_datetime('1899-12-30') + pd.to_timedelta(df_calendario['Fecha'], 'D')
+    df_calendario['Fecha'] = _convertir_fechas(df_calendario['Fecha'])
+    derivar_fechas = derivar_fechas and validar_calendario(df_calendario)
+    
+    indice_presupuesto = construir_indice_presupuesto(df_presupuesto)
+    if ejecutor is not None and len(df_gastos) > FILAS_POR_LOTE:
+        df_gastos, df_consolidado = enriquecer_en_lotes(
+            df_gastos, df_calendario, indice_presupuesto, derivar_fechas, años, ejecutor)
     else:
-        df_calendario['Fecha'] = pd.to_datetime(df_calendario['Fecha'])
+        df_gastos, df_consolidado = enriquecer_gastos(
+            df_gastos, df_calendario, indice_presupuesto, derivar_fechas, años)
     
-    # Merge gastos con calendario
-    df_gastos = df_gastos.merge(df_calendario[['Fecha', 'Mes', 'Mes Num', 'Trimestre', 'Semestre', 'Año']], 
-                                on='Fecha', how='left')
+    # Tipos compactos para las tablas grandes
+    df_gastos = optimizar_tipos(df_gastos, 'gastos')
+    df_consolidado = optimizar_tipos(df_consolidado, 'consolidado')
     
-    # Merge con presupuesto
-    df_consolidado = df_gastos.merge(df_presupuesto, left_on='Cuenta', right_on='cuenta', how='left')
+    return df_gastos, df_presupuesto, df_calendario, df_consolidado
+
+def optimizar_tipos(df, nombre='tabla'):
+    """Reducir la memoria de un DataFrame y registrar los bytes antes y después
     
-    # Filtrar solo datos de 2019
-    df_consolidado = df_consolidado[df_consolidado['Año'] == 2019]
+    Los textos repetidos pasan a category, los enteros al menor tipo que los
+    contiene y los decimales con valores enteros a entero. Los decimales reales
+    se mantienen en float64 para no perder precisión en las sumas.
+    """
+    antes = df.memory_usage(deep=True).sum()
     
-    return df_gastos, df_presupuesto, df_calendario, df_consolidado
+    tipos = {}
+    for columna, serie in df.items():
+        if pd.api.types.is_string_dtype(serie.dtype) or serie.dtype == object:
+            if serie.nunique() <= len(serie) // 2:
+                tipos[columna] = 'category'
+        elif pd.api.types.is_integer_dtype(serie.dtype):
+            tipos[columna] = pd.to_numeric(serie, downcast='integer').dtype
+        elif pd.api.types.is_float_dtype(serie.dtype) and serie.notna().all() \
+                and (serie == np.floor(serie)).all():
+            tipos[columna] = pd.to_numeric(serie, downcast='integer').dtype
+    df = df.astype(tipos)
+    
+    despues = df.memory_usage(deep=True).sum()
+    logger.info('Tipos de %s optimizados: %d -> %d bytes', nombre, antes, despues)
+    return df
+
+def derivar_calendario(fechas):
+    """Derivar Mes, Mes Num, Trimestre, Semestre y Año de una columna datetime64
+    
+    Equivale a unir con la hoja Tabla Calendario, pero sin join y con los textos
+    como categóricos. Las fechas nulas quedan con partes nulas.
+    """
+    # Días desde 1970-01-01; los meses se resuelven con una tabla por día del
+    # rango, mucho más barata que convertir cada fila a datetime64[M]
+    valores = fechas.to_numpy()
+    nulas = np.isnat(valores)
+    dias = valores.astype('datetime64[D]').astype('int64')
+    primero = dias[~nulas].min() if (~nulas).any() else 0
+    dias = np.where(nulas, primero, dias) - primero
+    tabla_meses = np.arange(primero, primero + dias.max(initial=0) + 1).astype('datetime64[D]')
+    meses = tabla_meses.astype('datetime64[M]').astype('int64')[dias]
+    indice_mes = np.where(nulas, -1, meses % 12).astype('int8')
+    mes_num = (indice_mes + 1).astype('int8')
+    año = (meses // 12 + 1970).astype('int16')
+    if nulas.any():
+        mes_num = np.where(nulas, np.nan, mes_num)
+        año = np.where(nulas, np.nan, año)
+    
+    return pd.DataFrame({
+        'Mes': pd.Categorical.from_codes(indice_mes, MESES),
+        'Mes Num': mes_num,
+        'Trimestre': pd.Categorical.from_codes(np.where(nulas, -1, indice_mes // 3), TRIMESTRES),
+        'Semestre': pd.Categorical.from_codes(np.where(nulas, -1, indice_mes // 6), SEMESTRES),
+        'Año': año
+    }, index=fechas.index)
+
+def validar_calendario(df_calendario):
+    """Comprobar que las partes derivadas coinciden con la hoja Tabla Calendario
+    
+    La derivación es función sólo de la fecha, por lo que basta con compararla
+    sobre las fechas del propio calendario.
+    """
+    derivado = derivar_calendario(df_calendario['Fecha'])
+    for columna in COLUMNAS_CALENDARIO:
+        esperado = df_calendario[columna].to_numpy()
+        if not (derivado[columna].astype(esperado.dtype).to_numpy() == esperado).all():
+            return False
+    return True
+
+@medir
+def enriquecer_gastos(df_gastos, df_calendario, indice_presupuesto, derivar_fechas=False, años=None):
+    """Aplicar calendario, categoría y departamento a filas de gastos (el libro completo o sólo un delta)
+    
+    Con años el filtro se aplica sobre la fecha antes de las uniones, de modo
+    que las filas descartadas no pasan por el calendario ni por el índice.
+    """
+    # Convertir fecha de Excel a datetime si es necesario
+    df_gastos = df_gastos.assign(Fecha=_convertir_fechas(df_gastos['Fecha']))
+    if años:
+        df_gastos = df_gastos[df_gastos['Fecha'].dt.year.isin(años).to_numpy()].reset_index(drop=True)
+    
+    with bloque('unir_calendario'):
+        if derivar_fechas:
+            # Partes de la fecha desde una tabla de meses por día (derivar_calendario), sin join
+            df_gastos = pd.concat([df_gastos, derivar_calendario(df_gastos['Fecha'])], axis=1)
+        else:
+            # Merge gastos con calendario
+            df_gastos = df_gastos.merge(df_calendario[['Fecha'] + COLUMNAS_CALENDARIO], on='Fecha', how='left')
+    
+    # Asignar categoría y departamento de cada cuenta; el presupuesto se une ya agregado
+    with bloque('unir_categoria'):
+        df_consolidado = df_gastos.assign(
+            Categoría=df_gastos['Cuenta'].map(indice_presupuesto['Categoría']),
+            Departamento=df_gastos['Cuenta'].map(indice_presupuesto['Departamento'])
+        )
+    
+    return df_gastos, ordenar_particiones(df_consolidado)
+
+@medir
+def enriquecer_en_lotes(df_gastos, df_calendario, indice_presupuesto, derivar_fechas, años, ejecutor):
+    """Aplicar enriquecer_gastos a lotes de FILAS_POR_LOTE filas repartidos entre procesos"""
+    lotes = [df_gastos.iloc[inicio:inicio + FILAS_POR_LOTE] for inicio in range(0, len(df_gastos), FILAS_POR_LOTE)]
+    n = len(lotes)
+    resultados = list(ejecutor.map(enriquecer_gastos, lotes, [df_calendario] * n,
+                                   [indice_presupuesto] * n, [derivar_fechas] * n, [años] * n))
+    
+    # Cada lote viene ordenado por partición; el orden estable conserva el de los lotes
+    df_gastos = pd.concat([gastos for gastos, _ in resultados], ignore_index=True)
+    df_consolidado = ordenar_particiones(pd.concat([consolidado for _, consolidado in resultados], ignore_index=True))
+    return df_gastos, df_consolidado
+
+def ordenar_particiones(df_consolidado):
+    """Ordenar el consolidado por año y departamento (orden estable dentro de cada tramo)"""
+    return df_consolidado.sort_values(CLAVES_PARTICION, kind='stable', ignore_index=True)
+
+def concatenar_tipados(df_base, df_delta):
+    """Concatenar un delta a una tabla conservando sus tipos compactos
+    
+    El delta pasa por optimizar_tipos y cada columna categórica de la base se
+    lleva a la unión de categorías, de modo que el resultado no vuelve a
+    enteros de 64 bits, decimales ni texto genérico.
+    """
+    df_delta = optimizar_tipos(df_delta, 'delta')
+    for columna, serie in df_base.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype) and columna in df_delta.columns:
+            nuevas = pd.Index(df_delta[columna].dropna().unique()).difference(serie.cat.categories)
+            if len(nuevas):
+                serie = serie.cat.add_categories(nuevas)
+                df_base = df_base.assign(**{columna: serie})
+            df_delta = df_delta.assign(**{columna: df_delta[columna].astype(serie.dtype)})
+    return pd.concat([df_base, df_delta], ignore_index=True)
+
+def _claves_orden_particion(df):
+    """Clave entera que reproduce el orden de ordenar_particiones (nulos al final)"""
+    clave = np.zeros(len(df), dtype=np.int64)
+    for columna in CLAVES_PARTICION:
+        codigos, valores = pd.factorize(df[columna], sort=True)
+        codigos = np.where(codigos < 0, len(valores), codigos)
+        clave = clave * (len(valores) + 1) + codigos
+    return clave
+
+def concatenar_consolidado(df_consolidado, df_delta):
+    """Agregar un delta al consolidado con sus tipos y su orden por particiones
+    
+    El consolidado ya está ordenado: sólo se ordena el delta y cada fila se
+    intercala al final del tramo de su partición con búsqueda binaria, sin
+    volver a ordenar la tabla completa.
+    """
+    df = concatenar_tipados(df_consolidado, df_delta)
+    n = len(df_consolidado)
+    claves = _claves_orden_particion(df)
+    orden_delta = np.argsort(claves[n:], kind='stable')
+    posiciones = np.searchsorted(claves[:n], claves[n:][orden_delta], side='right')
+    return df.take(np.insert(np.arange(n), posiciones, n + orden_delta)).reset_index(drop=True)
+
+def indexar_particiones(df_consolidado):
+    """Ubicar el tramo [inicio, fin) de cada (año, departamento) en el consolidado ordenado"""
+    n = len(df_consolidado)
+    cambio = np.zeros(n, dtype=bool)
+    if n:
+        cambio[0] = True
+    for clave in CLAVES_PARTICION:
+        codigos = pd.factorize(df_consolidado[clave], use_na_sentinel=False)[0]
+        cambio[1:] |= codigos[1:] != codigos[:-1]
+    inicios = np.flatnonzero(cambio)
+    fines = np.append(inicios[1:], n)
+    claves = zip(*(df_consolidado[clave].to_numpy()[inicios].tolist() for clave in CLAVES_PARTICION))
+    return {clave: (inicio, fin) for clave, inicio, fin in zip(claves, inicios.tolist(), fines.tolist())}
+
+def seleccionar_particiones(df_consolidado, años=None, departamentos=None):
+    """Extraer sólo los tramos de los años y departamentos pedidos
+    
+    Sobre tablas mapeadas en memoria sólo se leen las páginas de esos tramos.
+    """
+    if not años and not departamentos:
+        return df_consolidado
+    tramos = [
+        df_consolidado.iloc[inicio:fin]
+        for (año, departamento), (inicio, fin) in indexar_particiones(df_consolidado).items()
+        if (not años or año in años) and (not departamentos or departamento in departamentos)
+    ]
+    if not tramos:
+        return df_consolidado.iloc[:0]
+    return pd.concat(tramos, ignore_index=True)
+
+def normalizar_gastos_nuevos(df_nuevos):
+    """Tipar filas nuevas de gastos; lanza KeyError/ValueError/TypeError si alguna no es válida
+    
+    La fecha se convierte aquí y no al enriquecer, de modo que una fecha
+    inválida se rechaza antes de escribir o aplicar el archivo.
+    """
+    df_nuevos = df_nuevos[COLUMNAS_GASTOS].astype({'Cuenta': 'int64', 'Gastos': 'float64'})
+    fechas = _convertir_fechas(df_nuevos['Fecha'])
+    if fechas.isna().any():
+        raise ValueError('Hay filas de gastos sin Fecha')
+    return df_nuevos.assign(Fecha=fechas)
+
+def leer_gastos_nuevos(ruta):
+    """Leer filas nuevas de gastos (Fecha, Cuenta, Gastos) desde un CSV o Parquet"""
+    if ruta.endswith('.parquet'):
+        df_nuevos = pd.read_parquet(ruta, columns=COLUMNAS_GASTOS)
+    else:
+        df_nuevos = pd.read_csv(ruta, usecols=COLUMNAS_GASTOS)
+    return normalizar_gastos_nuevos(df_nuevos)
+
+def construir_indice_presupuesto(df_presupuesto):
+    """Construir el índice de presupuesto anual por cuenta (con su categoría y departamento)"""
+    df_presupuesto = df_presupuesto.rename(columns={'cuenta': 'Cuenta'})
+    if 'Departamento' not in df_presupuesto.columns:
+        df_presupuesto = df_presupuesto.assign(Departamento=DEPARTAMENTO_PREDETERMINADO)
+    indice = df_presupuesto.groupby('Cuenta').agg({
+        'Categoría': 'first',
+        'Departamento': 'first',
+        'Presupuesto Anual': 'sum'
+    })
+    return indice
+
+def filtrar_presupuesto(indice_presupuesto, categorias=None, cuentas=None, departamentos=None, n_años=1):
+    """Seleccionar las cuentas del índice de presupuesto que cumplen los filtros
+    
+    El presupuesto es anual: con n_años > 1 se multiplica por los años que
+    abarca la vista para compararlo con el gasto acumulado del período.
+    """
+    mascara = np.ones(len(indice_presupuesto), dtype=bool)
+    if categorias:
+        mascara &= indice_presupuesto['Categoría'].isin(categorias).to_numpy()
+    if cuentas:
+        mascara &= indice_presupuesto.index.isin(cuentas)
+    if departamentos:
+        mascara &= indice_presupuesto['Departamento'].isin(departamentos).to_numpy()
+    presupuesto = indice_presupuesto[mascara]
+    if n_años > 1:
+        presupuesto = presupuesto.assign(**{'Presupuesto Anual': presupuesto['Presupuesto Anual'] * n_años})
+    return presupuesto
+
+# Validación de los datos al cargarlos: filas de muestra por problema y
+# umbrales de atípicos por categoría (z-score y vallas de Tukey sobre el IQR)
+MUESTRAS_VALIDACION = 20
+UMBRAL_Z = 3.0
+FACTOR_IQR = 3.0
+COLUMNAS_VALIDACION = ['Fecha', 'Cuenta', 'Categoría', 'Gastos']
+
+def _muestra(df, mascara):
+    """Primeras filas marcadas por la máscara, como registros serializables en JSON"""
+    filas = df.loc[mascara, COLUMNAS_VALIDACION].head(MUESTRAS_VALIDACION)
+    return [
+        {'Fecha': None if pd.isna(fecha) else pd.Timestamp(fecha).strftime('%Y-%m-%d'),
+         'Cuenta': int(cuenta), 'Categoría': None if pd.isna(categoria) else str(categoria),
+         'Gastos': float(gastos)}
+        for fecha, cuenta, categoria, gastos in filas.itertuples(index=False)
+    ]
+
+def _dias(fechas):
+    """Días desde 1970-01-01 de una columna de fechas (las nulas quedan en NaT)"""
+    return np.asarray(fechas, dtype='datetime64[ns]').astype('datetime64[D]')
+
+@medir
+def validar_datos(df_gastos, df_presupuesto, df_calendario, df_consolidado):
+    """Revisar el libro completo y devolver un reporte serializable en JSON
+    
+    Cada regla es una máscara vectorizada sobre las columnas del consolidado:
+    cuentas huérfanas (sin categoría en el presupuesto), filas duplicadas,
+    montos negativos, atípicos por categoría y fechas fuera del calendario.
+    Del presupuesto se revisan las cuentas sin monto y del calendario los
+    días faltantes dentro de su rango.
+    """
+    fechas = _dias(df_consolidado['Fecha'])
+    cuentas = df_consolidado['Cuenta'].to_numpy()
+    gastos = df_consolidado['Gastos'].to_numpy(dtype=np.float64)
+    codigos, categorias = pd.factorize(df_consolidado['Categoría'])
+    
+    huerfanas = codigos < 0
+    duplicadas = df_consolidado.duplicated(COLUMNAS_GASTOS).to_numpy()
+    negativas = gastos < 0
+    
+    # Estadísticos por categoría en una pasada; cada fila toma los de su grupo
+    por_categoria = pd.Series(gastos[~huerfanas]).groupby(codigos[~huerfanas])
+    estadisticos = pd.concat([por_categoria.mean(), por_categoria.std(ddof=0),
+                              por_categoria.quantile(0.25), por_categoria.quantile(0.75)], axis=1)
+    estadisticos = estadisticos.reindex(np.arange(len(categorias))).to_numpy()
+    media, desvio, q1, q3 = (np.append(columna, np.nan)[codigos] for columna in estadisticos.T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(desvio > 0, (gastos - media) / desvio, 0.0)
+    iqr = q3 - q1
+    atipicas = (np.abs(z) > UMBRAL_Z) | (gastos < q1 - FACTOR_IQR * iqr) | (gastos > q3 + FACTOR_IQR * iqr)
+    
+    # Fechas de gastos ausentes del calendario y días faltantes dentro de él
+    calendario = np.unique(_dias(df_calendario['Fecha'].dropna()))
+    nulas = np.isnat(fechas)
+    posiciones = np.clip(np.searchsorted(calendario, fechas), 0, max(len(calendario) - 1, 0))
+    fuera_calendario = ~nulas & (calendario[posiciones] != fechas if len(calendario) else True)
+    saltos = np.flatnonzero(np.diff(calendario).astype(np.int64) > 1)
+    huecos = [[str(calendario[i] + 1), str(calendario[i + 1] - 1)] for i in saltos]
+    
+    presupuesto = df_presupuesto.rename(columns={'cuenta': 'Cuenta'})
+    sin_presupuesto = presupuesto['Presupuesto Anual'].isna() | presupuesto['Categoría'].isna()
+    
+    reporte = {
+        'filas': len(df_consolidado),
+        'cuentas_huerfanas': {
+            'filas': int(huerfanas.sum()),
+            'gastos': float(gastos[huerfanas].sum()),
+            'cuentas': sorted(set(cuentas[huerfanas].tolist()))[:MUESTRAS_VALIDACION]
+        },
+        'cuentas_sin_presupuesto': sorted(set(presupuesto.loc[sin_presupuesto, 'Cuenta'].tolist())),
+        'duplicadas': {'filas': int(duplicadas.sum()), 'muestra': _muestra(df_consolidado, duplicadas)},
+        'negativas': {
+            'filas': int(negativas.sum()),
+            'gastos': float(gastos[negativas].sum()),
+            'muestra': _muestra(df_consolidado, negativas)
+        },
+        'atipicas': {'filas': int(atipicas.sum()), 'muestra': _muestra(df_consolidado, atipicas)},
+        'calendario': {
+            'fechas_nulas': int(nulas.sum()),
+            'fuera_calendario': int(fuera_calendario.sum()),
+            'fechas': sorted(set(str(fecha) for fecha in fechas[fuera_calendario]))[:MUESTRAS_VALIDACION],
+            'huecos': huecos[:MUESTRAS_VALIDACION]
+        }
+    }
+    reporte['problemas'] = (reporte['cuentas_huerfanas']['filas'] + len(reporte['cuentas_sin_presupuesto'])
+                            + reporte['duplicadas']['filas'] + reporte['negativas']['filas']
+                            + reporte['atipicas']['filas'] + int(nulas.sum())
+                            + reporte['calendario']['fuera_calendario'] + len(huecos))
+    return reporte
+
+@medir
+def cargar_datos(ruta=RUTA_ORIGEN, ruta_cache=RUTA_CACHE, compartido=False, derivar_fechas=True,
+                 años=None, departamentos=None):
+    """Cargar y procesar los datos desde el archivo Excel
+    
+    Si existe una caché columnar vigente para el libro (mismo mtime/tamaño o
+    mismo hash de contenido) se carga desde ella sin volver a parsear el Excel.
+    Con compartido=True las tablas se mapean en memoria de solo lectura, de modo
+    que todos los workers comparten las mismas páginas del sistema operativo.
+    La caché guarda siempre el libro completo; con años o departamentos el
+    consolidado devuelto contiene sólo esas particiones.
+    
+    ruta puede ser un directorio: sus libros se leen y enriquecen en paralelo
+    en un pool de procesos cuando su tamaño lo justifica.
+    """
+    mmap_mode = 'r' if compartido else None
+    datos = leer_cache(ruta, ruta_cache, mmap_mode)
+    if datos is None:
+        # La huella se toma antes de leer: si el libro cambia durante la lectura
+        # las tablas viejas no deben quedar guardadas con la huella nueva
+        huella = estado_origen(ruta) + (_hash_origen(ruta),)
+        rutas = listar_libros(ruta)
+        with _crear_ejecutor(rutas) as ejecutor:
+            hojas = leer_excel(rutas[0]) if ejecutor is None and len(rutas) == 1 else leer_libros(rutas, ejecutor)
+            datos = procesar_datos(*hojas, derivar_fechas=derivar_fechas, ejecutor=ejecutor)
+        # La validación se hace una vez por versión del origen y se guarda con la caché
+        validacion = validar_datos(*datos)
+        if validacion['problemas']:
+            logger.warning('Validación de %s: %d problemas en %d filas', ruta, validacion['problemas'],
+                           validacion['filas'])
+        if estado_origen(ruta) != huella[:2]:
+            logger.warning('%s cambió durante la lectura; no se guarda la caché', ruta)
+        else:
+            guardar_cache(datos, ruta, ruta_cache, validacion, huella)
+            if compartido:
+                datos = leer_cache(ruta, ruta_cache, mmap_mode) or datos
+    if años or departamentos:
+        df_gastos, df_presupuesto, df_calendario, df_consolidado = datos
+        datos = df_gastos, df_presupuesto, df_calendario, seleccionar_particiones(df_consolidado, años, departamentos)
+    return datos
+
+def _hash_archivo(ruta):
+    """Calcular el hash SHA-256 del contenido de un archivo"""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for parte in iter(lambda: archivo.read(1 << 20), b''):
+            sha.update(parte)
+    return sha.hexdigest()
+
+def _hash_origen(ruta):
+    """Hash del libro o, para un directorio, de los nombres y contenidos de sus libros"""
+    if not os.path.isdir(ruta):
+        return _hash_archivo(ruta)
+    sha = hashlib.sha256()
+    for libro in listar_libros(ruta):
+        sha.update(os.path.basename(libro).encode('utf-8'))
+        sha.update(bytes.fromhex(_hash_archivo(libro)))
+    return sha.hexdigest()
+
+def estado_origen(ruta=RUTA_ORIGEN):
+    """(mtime_ns, tamaño) del libro o del conjunto de libros de un directorio"""
+    if not os.path.isdir(ruta):
+        estado = os.stat(ruta)
+        return estado.st_mtime_ns, estado.st_size
+    # El mtime del directorio cambia al agregar o quitar libros
+    estados = [os.stat(libro) for libro in listar_libros(ruta)]
+    return (max([os.stat(ruta).st_mtime_ns] + [estado.st_mtime_ns for estado in estados]),
+            sum(estado.st_size for estado in estados))
+
+def _leer_json(ruta):
+    """Leer un JSON, devolviendo None si no existe o está corrupto"""
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+def _escribir_json(ruta, contenido):
+    """Escribir un JSON de forma atómica (archivo temporal + reemplazo)"""
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(contenido, archivo, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def _guardar_tabla(df, carpeta):
+    """Guardar cada columna de un DataFrame como un arreglo .npy"""
+    os.makedirs(carpeta, exist_ok=True)
+    columnas = []
+    for i, (nombre, serie) in enumerate(df.items()):
+        archivo = f'{i:03d}.npy'
+        columna = {'nombre': nombre, 'archivo': archivo, 'dtype': str(serie.dtype)}
+        if not isinstance(serie.dtype, np.dtype) or serie.dtype == object:
+            # Los textos se guardan como códigos + categorías
+            categorico = pd.Categorical(serie)
+            columna['categorias'] = categorico.categories.tolist()
+            valores = categorico.codes
+        else:
+            valores = serie.to_numpy()
+        np.save(os.path.join(carpeta, archivo), valores)
+        columnas.append(columna)
+    return columnas
+
+def _leer_tabla(carpeta, columnas, mmap_mode=None):
+    """Reconstruir un DataFrame a partir de sus columnas .npy
+    
+    Con mmap_mode los arreglos se mapean en memoria sin copiarse y los textos
+    se mantienen como categóricos sobre los códigos mapeados.
+    """
+    datos = {}
+    for columna in columnas:
+        valores = np.load(os.path.join(carpeta, columna['archivo']), mmap_mode=mmap_mode)
+        if 'categorias' in columna:
+            valores = pd.Categorical.from_codes(valores, columna['categorias'])
+            if mmap_mode is None and columna['dtype'] != 'category':
+                valores = pd.Series(valores).astype(columna['dtype'])
+        datos[columna['nombre']] = valores
+    return pd.DataFrame(datos, copy=False)
+
+@medir
+def guardar_cache(datos, ruta=RUTA_ORIGEN, ruta_cache=RUTA_CACHE, validacion=None, huella=None):
+    """Persistir las tablas procesadas en formato columnar junto a la huella del origen
+    
+    El reporte de validación, si se da, se guarda en la misma versión. huella
+    es (mtime_ns, tamaño, sha256) del origen tomada antes de leerlo; sin ella
+    se calcula ahora, lo que sólo es correcto si el origen no cambió desde la
+    lectura.
+    """
+    mtime_ns, tamano, huella = huella or estado_origen(ruta) + (_hash_origen(ruta),)
+    # El formato forma parte del nombre: un cambio de esquema no reutiliza tablas viejas
+    nombre_version = f'{FORMATO_CACHE}-{huella[:16]}'
+    version = os.path.join(ruta_cache, nombre_version)
+    
+    # Se escribe en una carpeta temporal y se renombra: si otro proceso ya
+    # publicó la misma versión, la suya se conserva y la temporal se descarta
+    temporal = f'{version}.{os.getpid()}.tmp'
+    tablas = {}
+    for nombre, df in zip(TABLAS, datos):
+        tablas[nombre] = _guardar_tabla(df, os.path.join(temporal, nombre))
+    if validacion is not None:
+        _escribir_json(os.path.join(temporal, 'validacion.json'), validacion)
+    try:
+        os.rename(temporal, version)
+    except OSError:
+        shutil.rmtree(temporal, ignore_errors=True)
+    
+    # El puntero a la versión vigente se reemplaza de forma atómica
+    _escribir_json(os.path.join(ruta_cache, 'actual.json'), {
+        'formato': FORMATO_CACHE,
+        'version': nombre_version,
+        'sha256': huella,
+        'mtime_ns': mtime_ns,
+        'tamano': tamano,
+        'tablas': tablas
+    })
+    
+    # Eliminar versiones anteriores (no las temporales que otro proceso esté escribiendo)
+    for carpeta in os.listdir(ruta_cache):
+        if carpeta != nombre_version and not carpeta.endswith('.tmp') \
+                and os.path.isdir(os.path.join(ruta_cache, carpeta)):
+            shutil.rmtree(os.path.join(ruta_cache, carpeta), ignore_errors=True)
+
+@medir
+def leer_cache(ruta=RUTA_ORIGEN, ruta_cache=RUTA_CACHE, mmap_mode=None):
+    """Cargar las tablas desde la caché columnar si sigue vigente, o None si no"""
+    meta = _leer_json(os.path.join(ruta_cache, 'actual.json'))
+    if meta is None or meta.get('formato') != FORMATO_CACHE:
+        return None
+    
+    mtime_ns, tamano = estado_origen(ruta)
+    if (meta['mtime_ns'], meta['tamano']) != (mtime_ns, tamano):
+        # El origen pudo haberse tocado sin cambiar su contenido
+        if meta['tamano'] != tamano or meta['sha256'] != _hash_origen(ruta):
+            return None
+        # Mismo contenido: se registra el nuevo mtime para no volver a calcular el hash
+        try:
+            _escribir_json(os.path.join(ruta_cache, 'actual.json'), dict(meta, mtime_ns=mtime_ns))
+        except OSError:
+            logger.warning('No se pudo actualizar la huella de la caché en %s', ruta_cache)
+    
+    version = os.path.join(ruta_cache, meta['version'])
+    try:
+        return tuple(_leer_tabla(os.path.join(version, nombre), meta['tablas'][nombre], mmap_mode)
+                     for nombre in TABLAS)
+    except (OSError, KeyError, ValueError):
+        return None
+
+def leer_validacion(ruta_cache=RUTA_CACHE):
+    """Reporte de validación de la versión vigente de la caché, o None si no lo hay"""
+    meta = _leer_json(os.path.join(ruta_cache, 'actual.json'))
+    if meta is None or meta.get('formato') != FORMATO_CACHE:
+        return None
+    return _leer_json(os.path.join(ruta_cache, meta['version'], 'validacion.json'))
+
+MESES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+         'Julio', 'Agosto', 'Setiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+# Tabla matriz: por encima de este número de filas se pagina en el servidor
+LIMITE_FILAS_HTML = 200
+FILAS_POR_PAGINA = 50
+COLUMNAS_TABLA = ['Etiqueta', 'Presupuesto Anual', 'Gastos', 'Saldo', '% de Gasto']
+COLUMNAS_PRONOSTICO = ['Proyección', 'Agotamiento']
+
+def listar_años(cubo):
+    """Años con datos en el cubo, como enteros ordenados
+    
+    Año queda en float64 si alguna fecha es nula o no está en el calendario;
+    los controles y los rangos de fechas necesitan los años enteros.
+    """
+    return sorted(int(año) for año in cubo['Año'].dropna().unique())
+
+def describir_periodo(cubo, años=None, meses=None):
+    """Describir el período de los filtros de años y meses, p. ej. 'Enero - Agosto de 2019'
+    
+    El período se recorta a los meses con datos. Varios años seguidos sin
+    rango de meses se describen como un solo tramo; si no son seguidos o hay
+    un rango de meses, se describe ese rango en cada año.
+    """
+    fechas = filtrar_cubo(cubo, años, meses)[['Año', 'Mes Num']].dropna()
+    if fechas.empty:
+        return ''
+    años_datos = sorted(int(año) for año in fechas['Año'].unique())
+    if len(años_datos) > 1 and (meses or años_datos[-1] - años_datos[0] + 1 != len(años_datos)):
+        mes_inicio, mes_fin = int(fechas['Mes Num'].min()) - 1, int(fechas['Mes Num'].max()) - 1
+        rango = MESES[mes_inicio] if mes_inicio == mes_fin else f'{MESES[mes_inicio]} - {MESES[mes_fin]}'
+        return f"{rango} de {', '.join(map(str, años_datos[:-1]))} y {años_datos[-1]}"
+    periodos = fechas['Año'].to_numpy().astype('int64') * 12 + fechas['Mes Num'].to_numpy() - 1
+    (año_inicio, mes_inicio), (año_fin, mes_fin) = divmod(int(periodos.min()), 12), divmod(int(periodos.max()), 12)
+    if año_inicio != año_fin:
+        return f'{MESES[mes_inicio]} de {año_inicio} - {MESES[mes_fin]} de {año_fin}'
+    if mes_inicio != mes_fin:
+        return f'{MESES[mes_inicio]} - {MESES[mes_fin]} de {año_fin}'
+    return f'{MESES[mes_fin]} de {año_fin}'
+
+TRIMESTRES = ['T1', 'T2', 'T3', 'T4']
+SEMESTRES = ['Sem 1', 'Sem 2']
+COLUMNAS_CALENDARIO = ['Mes', 'Mes Num', 'Trimestre', 'Semestre', 'Año']
+
+# Plantilla del tema oscuro compartida por todos los gráficos: se construye una
+# vez, en el primer gráfico y no al importar, y cada gráfico sólo declara lo
+# que lo distingue
+@lru_cache(maxsize=None)
+def plantilla():
+    tema = go.layout.Template(pio.templates['plotly'])
+    tema.layout.update(
+        paper_bgcolor="#13121D",
+        plot_bgcolor="#1B1B2D",
+        font={'color': "#94F8FD", 'family': 'Segoe UI'},
+        xaxis=dict(gridcolor='#2A2A3E', zeroline=False),
+        yaxis=dict(gridcolor='#2A2A3E', zeroline=False),
+        height=300,
+        showlegend=False
+    )
+    return tema
+
+# Claves de agregación compartidas por todos los gráficos
+CLAVES_CUBO = ['Departamento', 'Categoría', 'Cuenta', 'Año', 'Semestre', 'Trimestre', 'Mes Num', 'Mes']
+
+@medir
+def construir_cubo(df_consolidado):
+    """Pre-agregar los gastos una sola vez por las claves de los gráficos
+    
+    El cubo queda ordenado por año y departamento, igual que el consolidado,
+    para que filtrar_cubo descarte los años no pedidos con búsqueda binaria.
+    """
+    cubo = df_consolidado.groupby(CLAVES_CUBO, observed=True, dropna=False, sort=False)['Gastos'].sum()
+    return ordenar_particiones(cubo.reset_index())
+
+def actualizar_cubo(cubo, df_delta):
+    """Incorporar al cubo los gastos de un delta sin reagrupar el consolidado completo"""
+    return construir_cubo(concatenar_tipados(cubo, construir_cubo(df_delta)))
+
+def resumir_cubo(cubo, por, presupuesto=None):
+    """Consolidar el cubo a un nivel más grueso (p. ej. 'Categoría' o ['Mes', 'Mes Num'])
+    
+    Si se pasa el índice de presupuesto (filtrado), su total por las mismas
+    claves se une al resumen; por debe limitarse entonces a Categoría/Cuenta.
+    """
+    por = [por] if isinstance(por, str) else list(por)
+    resumen = cubo.groupby(por, observed=True)['Gastos'].sum().to_frame()
+    if presupuesto is not None:
+        presupuesto_por = presupuesto.reset_index().groupby(por)['Presupuesto Anual'].sum()
+        resumen = resumen.join(presupuesto_por, how='outer').fillna(0)
+    return resumen.reset_index()
 
-def calcular_metricas(df_consolidado):
-    """Calcular las métricas principales del dashboard"""
-    total_gastado = df_consolidado['Gastos'].sum()
-    total_presupuesto = 621000  # Presupuesto total según la imagen
+def filtrar_cubo(cubo, años=None, meses=None, categorias=None, cuentas=None, departamentos=None):
+    """Seleccionar las celdas del cubo que cumplen los filtros del dashboard
+    
+    meses es un rango (inicio, fin) de números de mes; el resto son listas de
+    valores permitidos. Un filtro vacío o None no restringe. Los años se
+    resuelven primero sobre el cubo ordenado y el resto de los filtros sólo
+    recorre los tramos de esos años.
+    """
+    if años:
+        columna_año = cubo['Año'].to_numpy()
+        años = np.asarray(sorted(años))
+        inicios = np.searchsorted(columna_año, años, side='left')
+        fines = np.searchsorted(columna_año, años, side='right')
+        cubo = cubo.iloc[np.concatenate([np.arange(inicio, fin) for inicio, fin in zip(inicios, fines)])]
+    
+    mascara = np.ones(len(cubo), dtype=bool)
+    if departamentos:
+        mascara &= cubo['Departamento'].isin(departamentos).to_numpy()
+    if meses:
+        mascara &= cubo['Mes Num'].between(*meses).to_numpy()
+    if categorias:
+        mascara &= cubo['Categoría'].isin(categorias).to_numpy()
+    if cuentas:
+        mascara &= cubo['Cuenta'].isin(cuentas).to_numpy()
+    return cubo[mascara]
+
+@medir
+def calcular_metricas(cubo, presupuesto):
+    """Calcular las métricas principales del dashboard
+    
+    Sin presupuesto en la selección (p. ej. un departamento sin cuentas) el
+    porcentaje de gasto no está definido y se devuelve None.
+    """
+    total_gastado = cubo['Gastos'].sum()
+    total_presupuesto = presupuesto['Presupuesto Anual'].sum()
     saldo = total_presupuesto - total_gastado
-    porcentaje_gasto = (total_gastado / total_presupuesto) * 100
+    porcentaje_gasto = total_gastado / total_presupuesto * 100 if total_presupuesto else None
     
     return total_gastado, total_presupuesto, saldo, porcentaje_gasto
 
-def crear_grafico_velocimetro(total_gastado, total_presupuesto):
-    """Crear el gráfico de velocímetro para el total gastado"""
+def fechas_agotamiento(años, presupuesto, ritmo):
+    """Fecha en que se agota el presupuesto anual al ritmo mensual dado (vectorizado)
+    
+    Al ritmo constante el presupuesto dura presupuesto / ritmo meses desde el
+    inicio del año; la parte fraccionaria se reparte en los días de ese mes.
+    Sin ritmo o sin presupuesto la fecha queda en NaT.
+    """
+    años = np.asarray(años, dtype='int64')
+    presupuesto = np.asarray(presupuesto, dtype='float64')
+    ritmo = np.asarray(ritmo, dtype='float64')
+    valido = (ritmo > 0) & (presupuesto > 0)
+    
+    meses = np.divide(presupuesto, ritmo, out=np.zeros_like(ritmo), where=valido)
+    meses = np.minimum(meses, 1200)
+    mes_entero = np.floor(meses).astype('int64')
+    inicio_mes = ((años - 1970) * 12 + mes_entero).astype('datetime64[M]')
+    dias_mes = ((inicio_mes + 1).astype('datetime64[D]') - inicio_mes.astype('datetime64[D]')).astype('int64')
+    fechas = inicio_mes.astype('datetime64[D]') + np.floor((meses - mes_entero) * dias_mes).astype('int64')
+    return np.where(valido, fechas, np.datetime64('NaT'))
+
+@medir
+def pronosticar_gasto(cubo, indice_presupuesto):
+    """Proyectar el gasto al cierre de cada año y la fecha de agotamiento por cuenta
+    
+    Un solo paso vectorizado sobre la matriz (año x cuenta): el ritmo mensual
+    es el gasto acumulado entre los meses transcurridos del año (hasta el
+    último mes con gastos) y se extiende a los meses restantes.
+    """
+    años = np.sort(cubo['Año'].dropna().unique()).astype('int64')
+    cuentas = indice_presupuesto.index.union(pd.Index(cubo['Cuenta'].dropna().unique())).to_numpy()
+    
+    filas = cubo[cubo['Año'].notna() & cubo['Cuenta'].notna()]
+    i_año = np.searchsorted(años, filas['Año'].to_numpy())
+    i_cuenta = np.searchsorted(cuentas, filas['Cuenta'].to_numpy())
+    gastos = filas['Gastos'].to_numpy(dtype='float64')
+    
+    # Gasto acumulado por (año, cuenta) y último mes con gastos de cada año
+    acumulado = np.bincount(i_año * len(cuentas) + i_cuenta, weights=gastos,
+                            minlength=len(años) * len(cuentas)).reshape(len(años), len(cuentas))
+    meses = np.zeros(len(años), dtype='int64')
+    con_gasto = gastos != 0
+    np.maximum.at(meses, i_año[con_gasto], filas['Mes Num'].to_numpy()[con_gasto].astype('int64'))
+    
+    ritmo = acumulado / np.maximum(meses, 1)[:, None]
+    proyeccion = acumulado + ritmo * (12 - meses)[:, None]
+    presupuesto = indice_presupuesto['Presupuesto Anual'].reindex(cuentas).fillna(0).to_numpy(dtype='float64')
+    presupuesto = np.broadcast_to(presupuesto, acumulado.shape)
+    años_matriz = np.broadcast_to(años[:, None], acumulado.shape)
+    
+    pronostico = pd.DataFrame({
+        'Año': años_matriz.ravel(),
+        'Cuenta': np.tile(cuentas, len(años)),
+        'Presupuesto Anual': presupuesto.ravel(),
+        'Gastos': acumulado.ravel(),
+        'Meses': np.repeat(meses, len(cuentas)),
+        'Ritmo Mensual': ritmo.ravel(),
+        'Proyección': proyeccion.ravel(),
+        'Agotamiento': fechas_agotamiento(años_matriz.ravel(), presupuesto.ravel(), ritmo.ravel())
+    })
+    pronostico['Alerta'] = pronostico['Proyección'].to_numpy() > pronostico['Presupuesto Anual'].to_numpy()
+    indice = indice_presupuesto[['Categoría', 'Departamento']]
+    return pronostico.join(indice, on='Cuenta')
+
+def filtrar_pronostico(pronostico, años=None, categorias=None, cuentas=None, departamentos=None,
+                       todos_los_años=False):
+    """Filas del pronóstico del año a proyectar (el último de la selección) que cumplen los filtros
+    
+    Con todos_los_años se devuelven las filas de cada año seleccionado (o de
+    todos si no hay selección), para compararlas con el presupuesto de la
+    vista, que se escala por el número de años.
+    """
+    if pronostico.empty:
+        return pronostico
+    if todos_los_años:
+        mascara = pronostico['Año'].isin(años).to_numpy() if años else np.ones(len(pronostico), dtype=bool)
+    else:
+        año = max(años) if años else pronostico['Año'].max()
+        mascara = pronostico['Año'].to_numpy() == año
+    if categorias:
+        mascara &= pronostico['Categoría'].isin(categorias).to_numpy()
+    if cuentas:
+        mascara &= pronostico['Cuenta'].isin(cuentas).to_numpy()
+    if departamentos:
+        mascara &= pronostico['Departamento'].isin(departamentos).to_numpy()
+    return pronostico[mascara]
+
+def resumir_pronostico(pronostico, por=None):
+    """Consolidar el pronóstico por categoría o cuenta (o en total si por es None)
+    
+    Al ritmo constante proyección y ritmo se suman, y la fecha de agotamiento
+    del conjunto se recalcula con los totales.
+    """
+    columnas = ['Presupuesto Anual', 'Gastos', 'Ritmo Mensual', 'Proyección']
+    if por is None:
+        resumen = pronostico[columnas].sum().to_frame().T
+    else:
+        resumen = pronostico.groupby(por, observed=True)[columnas].sum().reset_index()
+    año = pronostico['Año'].max() if len(pronostico) else 1970
+    resumen['Agotamiento'] = fechas_agotamiento(
+        np.full(len(resumen), año), resumen['Presupuesto Anual'], resumen['Ritmo Mensual'])
+    return resumen
+
+def serializar_figura(fig):
+    """Serializar una figura a su JSON ya validado, listo para reenviarse desde caché"""
+    return json.loads(pio.to_json(fig, validate=False))
+
+@medir
+def crear_grafico_velocimetro(total_gastado, total_presupuesto, proyeccion=None):
+    """Crear el gráfico de velocímetro para el total gastado
+    
+    Con la proyección al cierre del año, la marca roja se ubica en el gasto
+    proyectado (y el eje se extiende si supera el presupuesto); sin ella, en
+    el 90% del presupuesto.
+    """
+    if proyeccion is None:
+        titulo, marca, tope = "Total Gastado", total_presupuesto * 0.9, total_presupuesto
+    else:
+        titulo = f"Total Gastado (proyección: {proyeccion / 1000:,.0f} mil)"
+        marca, tope = proyeccion, max(total_presupuesto, proyeccion)
+    
     fig = go.Figure(go.Indicator(
         mode = "gauge+number",
         value = total_gastado,
         domain = {'x': [0, 1], 'y': [0, 1]},
-        title = {'text': "Total Gastado", 'font': {'size': 12, 'color': '#94F8FD'}},
+        title = {'text': titulo, 'font': {'size': 12, 'color': '#94F8FD'}},
         number = {'font': {'size': 32, 'color': '#94F8FD'}, 'valueformat': ',.0f'},
         gauge = {
-            'axis': {'range': [None, total_presupuesto], 
+            'axis': {'range': [None, tope], 
                     'tickwidth': 1, 
                     'tickcolor': "#94F8FD",
                     'tickfont': {'color': '#94F8FD', 'size': 9}},
@@ -70,15 +951,15 @@ def crear_grafico_velocimetro(total_gastado, total_presupuesto):
             'threshold': {
                 'line': {'color': "#FF4444", 'width': 3},
                 'thickness': 0.75,
-                'value': total_presupuesto * 0.9
+                'value': marca
             }
         }
     ))
     
     fig.update_layout(
+        template=plantilla(),
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgba(0,0,0,0)",
-        font={'color': "#94F8FD", 'family': 'Segoe UI'},
         height=220,
         margin=dict(l=5, r=5, t=25, b=5),
         autosize=False
@@ -92,7 +973,7 @@ def crear_grafico_velocimetro(total_gastado, total_presupuesto):
         font=dict(size=9, color="#94F8FD")
     )
     fig.add_annotation(
-        text=f"{total_presupuesto/1000:.0f} mil",
+        text=f"{tope/1000:.0f} mil",
         x=0.85, y=0.15,
         showarrow=False,
         font=dict(size=9, color="#94F8FD")
@@ -100,9 +981,10 @@ def crear_grafico_velocimetro(total_gastado, total_presupuesto):
     
     return fig
 
-def crear_grafico_barras_categoria(df_consolidado):
+@medir
+def crear_grafico_barras_categoria(cubo):
     """Crear gráfico de barras horizontales por categoría"""
-    df_categoria = df_consolidado.groupby('Categoría')['Gastos'].sum().reset_index()
+    df_categoria = resumir_cubo(cubo, 'Categoría')
     df_categoria = df_categoria.sort_values('Gastos', ascending=True)
     
     fig = go.Figure(data=[
@@ -118,40 +1000,63 @@ def crear_grafico_barras_categoria(df_consolidado):
     ])
     
     fig.update_layout(
-        paper_bgcolor="#13121D",
-        plot_bgcolor="#1B1B2D",
-        font={'color': "#94F8FD", 'family': 'Segoe UI'},
+        template=plantilla(),
         xaxis=dict(
             showgrid=True,
-            gridcolor='#2A2A3E',
-            zeroline=False,
             showticklabels=False
         ),
         yaxis=dict(
             showgrid=False,
-            zeroline=False,
             tickfont=dict(size=10)
         ),
-        height=300,
-        margin=dict(l=120, r=20, t=20, b=40),
-        showlegend=False
+        margin=dict(l=120, r=20, t=20, b=40)
     )
     
     return fig
 
-def crear_grafico_lineas_mes(df_consolidado):
-    """Crear gráfico de líneas por mes"""
-    # Ordenar los meses correctamente
-    meses_orden = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto']
-    df_mes = df_consolidado.groupby(['Mes', 'Mes Num'])['Gastos'].sum().reset_index()
-    df_mes = df_mes.sort_values('Mes Num')
+@medir
+def agregar_por_mes(cubo):
+    """Calcular la serie mensual de gastos una sola vez
+    
+    Las columnas Trimestre y Semestre se derivan del número de mes, de modo que
+    los gráficos por trimestre y semestre se obtienen consolidando esta serie.
+    """
+    df_mensual = cubo.groupby(['Año', 'Mes Num'], observed=True)['Gastos'].sum().reset_index()
+    df_mensual = df_mensual.sort_values(['Año', 'Mes Num'], ignore_index=True)
+    
+    mes_num = df_mensual['Mes Num'].astype(int)
+    df_mensual['Mes'] = np.asarray(MESES)[mes_num - 1]
+    df_mensual['Trimestre'] = 'T' + ((mes_num - 1) // 3 + 1).astype(str)
+    df_mensual['Semestre'] = 'Sem ' + ((mes_num - 1) // 6 + 1).astype(str)
     
-    # Crear valores para el gráfico
-    valores = [60300, 56300, 54300, 59100, 59000, 58300, 60200, 58760]  # Valores aproximados de la imagen
+    # Con varios años en la selección, las etiquetas llevan el año
+    if df_mensual['Año'].nunique() > 1:
+        sufijo = ' ' + df_mensual['Año'].astype(int).astype(str)
+    else:
+        sufijo = ''
+    df_mensual['Etiqueta Mes'] = df_mensual['Mes'].str[:3] + sufijo
+    df_mensual['Etiqueta Trimestre'] = df_mensual['Trimestre'] + sufijo
+    df_mensual['Etiqueta Semestre'] = df_mensual['Semestre'] + sufijo
+    return df_mensual
+
+def resumir_periodos(df_mensual, periodo='Mes'):
+    """Totales de gasto por año y mes, trimestre o semestre a partir de la serie mensual"""
+    if periodo == 'Mes':
+        return df_mensual[['Año', 'Mes Num', 'Mes', 'Gastos']]
+    return df_mensual.groupby(['Año', periodo], sort=False)['Gastos'].sum().reset_index()
+
+def _consolidar_serie(df_mensual, etiqueta):
+    """Consolidar la serie mensual por trimestre o semestre conservando el orden"""
+    return df_mensual.groupby(etiqueta, sort=False)['Gastos'].sum()
+
+@medir
+def crear_grafico_lineas_mes(df_mensual):
+    """Crear gráfico de líneas por mes"""
+    valores = df_mensual['Gastos']
     
     fig = go.Figure(data=[
         go.Scatter(
-            x=list(range(1, 9)),
+            x=df_mensual['Etiqueta Mes'],
             y=valores,
             mode='lines+markers+text',
             line=dict(color='#94F8FD', width=3),
@@ -163,122 +1068,215 @@ def crear_grafico_lineas_mes(df_consolidado):
     ])
     
     fig.update_layout(
-        paper_bgcolor="#13121D",
-        plot_bgcolor="#1B1B2D",
-        font={'color': "#94F8FD", 'family': 'Segoe UI'},
+        template=plantilla(),
         xaxis=dict(
-            tickmode='linear',
-            tick0=1,
-            dtick=1,
-            showgrid=True,
-            gridcolor='#2A2A3E',
-            zeroline=False
+            type='category',
+            showgrid=True
         ),
         yaxis=dict(
             showgrid=True,
-            gridcolor='#2A2A3E',
-            zeroline=False,
-            range=[45000, 65000]
+            range=[valores.min() * 0.8, valores.max() * 1.1] if len(valores) else None
         ),
-        height=300,
-        margin=dict(l=60, r=20, t=20, b=40),
-        showlegend=False
+        margin=dict(l=60, r=20, t=20, b=40)
     )
     
-    # Agregar anotación "Total Gastado: 58,760"
-    fig.add_annotation(
-        text="Total Gastado: 58,760",
-        x=6, y=58760,
-        showarrow=True,
-        arrowhead=2,
-        arrowsize=1,
-        arrowwidth=2,
-        arrowcolor="#94F8FD",
-        font=dict(size=10, color="#94F8FD")
-    )
+    # Anotar el gasto del último mes de la selección
+    if len(valores):
+        fig.add_annotation(
+            text=f"Total Gastado: {valores.iloc[-1]:,.0f}",
+            x=df_mensual['Etiqueta Mes'].iloc[-1], y=valores.iloc[-1],
+            showarrow=True,
+            arrowhead=2,
+            arrowsize=1,
+            arrowwidth=2,
+            arrowcolor="#94F8FD",
+            font=dict(size=10, color="#94F8FD")
+        )
     
     return fig
 
-def crear_tabla_matriz(df_consolidado):
-    """Crear tabla matriz con los datos por categoría"""
-    df_tabla = df_consolidado.groupby('Categoría').agg({
-        'Gastos': 'sum',
-        'Presupuesto Anual': 'first'
-    }).reset_index()
+def resumir_tabla(cubo, presupuesto, nivel='Categoría', pronostico=None):
+    """Calcular presupuesto, gasto, saldo y % de gasto por categoría o por cuenta
+    
+    Con el pronóstico se agregan el gasto proyectado al cierre y la fecha de
+    agotamiento del presupuesto de cada fila.
+    """
+    por = ['Categoría'] if nivel == 'Categoría' else ['Cuenta', 'Categoría']
+    df_tabla = resumir_cubo(cubo, por, presupuesto)
+    if pronostico is not None:
+        resumen = resumir_pronostico(pronostico, nivel)[[nivel] + COLUMNAS_PRONOSTICO]
+        df_tabla = df_tabla.merge(resumen, on=nivel, how='left')
     
     df_tabla['Saldo'] = df_tabla['Presupuesto Anual'] - df_tabla['Gastos']
     df_tabla['% de Gasto'] = (df_tabla['Gastos'] / df_tabla['Presupuesto Anual'] * 100).round(1)
     
+    # Etiqueta de la fila según el nivel de detalle
+    if nivel == 'Categoría':
+        df_tabla['Etiqueta'] = df_tabla['Categoría'].astype(str)
+    else:
+        df_tabla['Etiqueta'] = df_tabla['Cuenta'].astype(str) + ' - ' + df_tabla['Categoría'].astype(str)
+    
     # Ordenar por total gastado descendente
-    df_tabla = df_tabla.sort_values('Gastos', ascending=False)
+    return df_tabla.sort_values('Gastos', ascending=False, ignore_index=True)
+
+def _formatear_miles(serie):
+    """Formatear una columna numérica completa con separador de miles"""
+    return serie.round().map('{:,.0f}'.format).to_numpy()
+
+def _formatear_fechas(serie):
+    """Formatear una columna de fechas como dd/mm/aaaa ('-' si no hay fecha)"""
+    return pd.to_datetime(serie).dt.strftime('%d/%m/%Y').fillna('-').to_numpy()
+
+def _fila_total(df_tabla, total_pronostico=None):
+    """Crear la fila de totales de la tabla matriz"""
+    total_presupuesto = df_tabla['Presupuesto Anual'].sum()
+    total_gastado = df_tabla['Gastos'].sum()
+    porcentaje = total_gastado / total_presupuesto * 100 if total_presupuesto else 0
+    celdas = [
+        html.Td('TOTAL', className='table-cell total-cell'),
+        html.Td(f"{total_presupuesto:,.0f}", className='table-cell total-cell'),
+        html.Td(f"{total_gastado:,.0f}", className='table-cell total-cell'),
+        html.Td(f"{df_tabla['Saldo'].sum():,.0f}", className='table-cell total-cell'),
+        html.Td(f"{porcentaje:.1f}%", className='table-cell total-cell')
+    ]
+    if total_pronostico is not None:
+        celdas += [
+            html.Td(f"{total_pronostico['Proyección'].sum():,.0f}", className='table-cell total-cell'),
+            html.Td(_formatear_fechas(total_pronostico['Agotamiento'])[0], className='table-cell total-cell')
+        ]
+    return html.Tr(celdas, className='table-row total-row')
+
+@medir
+def crear_tabla_matriz(cubo, presupuesto, nivel='Categoría', pronostico=None):
+    """Crear tabla matriz con los datos por categoría o por cuenta
+    
+    Hasta LIMITE_FILAS_HTML filas se genera una tabla HTML; por encima se usa
+    una DataTable paginada en el servidor (ver paginar_tabla).
+    """
+    df_tabla = resumir_tabla(cubo, presupuesto, nivel, pronostico)
+    total_pronostico = resumir_pronostico(pronostico) if pronostico is not None else None
+    if len(df_tabla) > LIMITE_FILAS_HTML:
+        return crear_tabla_paginada(df_tabla, nivel, total_pronostico)
     
     # Crear la tabla HTML
-    header = html.Tr([
-        html.Th('Categoría', className='table-header'),
-        html.Th('Total Presupuesto', className='table-header'),
-        html.Th('Total Gastado', className='table-header'),
-        html.Th('Saldo', className='table-header'),
-        html.Th('% de Gasto', className='table-header')
-    ])
+    encabezados = [nivel, 'Total Presupuesto', 'Total Gastado', 'Saldo', '% de Gasto']
+    if pronostico is not None:
+        encabezados += ['Proyección Cierre', 'Agota el']
+    header = html.Tr([html.Th(encabezado, className='table-header') for encabezado in encabezados])
     
-    rows = []
-    for _, row in df_tabla.iterrows():
-        # Determinar color según el porcentaje
-        if row['% de Gasto'] > 90:
-            class_name = 'table-row high-spending'
-        elif row['% de Gasto'] > 70:
-            class_name = 'table-row medium-spending'
-        else:
-            class_name = 'table-row low-spending'
-            
-        rows.append(html.Tr([
-            html.Td(row['Categoría'], className='table-cell'),
-            html.Td(f"{row['Presupuesto Anual']:,.0f}", className='table-cell'),
-            html.Td(f"{row['Gastos']:,.0f}", className='table-cell'),
-            html.Td(f"{row['Saldo']:,.0f}", className='table-cell'),
-            html.Td(f"{row['% de Gasto']:.1f}%", className='table-cell percent-cell')
-        ], className=class_name))
+    # Clase de cada fila según el porcentaje, calculada para toda la columna
+    porcentaje = df_tabla['% de Gasto'].to_numpy()
+    clases = np.select(
+        [porcentaje > 90, porcentaje > 70],
+        ['table-row high-spending', 'table-row medium-spending'],
+        default='table-row low-spending'
+    )
     
-    # Agregar fila de totales
-    total_row = html.Tr([
-        html.Td('TOTAL', className='table-cell total-cell'),
-        html.Td(f"{df_tabla['Presupuesto Anual'].sum():,.0f}", className='table-cell total-cell'),
-        html.Td(f"{df_tabla['Gastos'].sum():,.0f}", className='table-cell total-cell'),
-        html.Td(f"{df_tabla['Saldo'].sum():,.0f}", className='table-cell total-cell'),
-        html.Td(f"{(df_tabla['Gastos'].sum() / df_tabla['Presupuesto Anual'].sum() * 100):.1f}%", 
-                className='table-cell total-cell')
-    ], className='table-row total-row')
+    columnas = [
+        df_tabla['Etiqueta'].to_numpy(),
+        _formatear_miles(df_tabla['Presupuesto Anual']),
+        _formatear_miles(df_tabla['Gastos']),
+        _formatear_miles(df_tabla['Saldo']),
+        df_tabla['% de Gasto'].map('{:.1f}%'.format).to_numpy()
+    ]
+    clases_celda = ['table-cell'] * 4 + ['table-cell percent-cell']
+    if pronostico is not None:
+        columnas += [_formatear_miles(df_tabla['Proyección']), _formatear_fechas(df_tabla['Agotamiento'])]
+        clases_celda += ['table-cell'] * 2
+    # Cada fila es clicable: su id lleva la etiqueta para abrir el detalle
+    rows = [
+        html.Tr([
+            html.Td(valor, className=clase_celda) for valor, clase_celda in zip(fila, clases_celda)
+        ], id={'type': 'fila-matriz', 'index': fila[0]}, className=clase, n_clicks=0)
+        for *fila, clase in zip(*columnas, clases)
+    ]
     
-    rows.append(total_row)
+    # Agregar fila de totales
+    rows.append(_fila_total(df_tabla, total_pronostico))
     
     return html.Table([
         html.Thead([header]),
         html.Tbody(rows)
     ], className='data-table')
 
-def crear_grafico_anillo_semestre(df_consolidado):
-    """Crear gráfico de anillo para gastos por semestre"""
-    df_semestre = df_consolidado.groupby('Semestre')['Gastos'].sum().reset_index()
+def paginar_tabla(df_tabla, pagina, filas_por_pagina=FILAS_POR_PAGINA):
+    """Devolver los registros de una página de la tabla matriz"""
+    inicio = pagina * filas_por_pagina
+    pagina_df = df_tabla.iloc[inicio:inicio + filas_por_pagina]
+    if 'Agotamiento' in pagina_df.columns:
+        pagina_df = pagina_df.assign(Agotamiento=_formatear_fechas(pagina_df['Agotamiento']))
+    columnas = COLUMNAS_TABLA + [columna for columna in COLUMNAS_PRONOSTICO if columna in pagina_df.columns]
+    return pagina_df[columnas].to_dict('records')
+
+# Estilos de las DataTable, iguales a los de la tabla HTML
+ESTILO_ENCABEZADO = {'backgroundColor': '#2A2A3E', 'color': '#94F8FD', 'fontWeight': 'bold',
+                     'textTransform': 'uppercase', 'borderBottom': '2px solid #94F8FD'}
+ESTILO_CELDA = {'backgroundColor': 'rgba(27, 27, 45, 0.8)', 'color': '#94F8FD',
+                'fontFamily': 'Segoe UI', 'fontSize': 12, 'textAlign': 'left',
+                'border': 'none', 'borderBottom': '1px solid rgba(148, 248, 253, 0.2)'}
+
+def crear_tabla_paginada(df_tabla, nivel, total_pronostico=None):
+    """Crear una DataTable con paginación en el servidor para matrices grandes"""
+    formato_miles = Format(group=Group.yes, precision=0, scheme=Scheme.fixed)
+    columnas = [
+        {'name': nivel, 'id': 'Etiqueta'},
+        {'name': 'Total Presupuesto', 'id': 'Presupuesto Anual', 'type': 'numeric', 'format': formato_miles},
+        {'name': 'Total Gastado', 'id': 'Gastos', 'type': 'numeric', 'format': formato_miles},
+        {'name': 'Saldo', 'id': 'Saldo', 'type': 'numeric', 'format': formato_miles},
+        {'name': '% de Gasto', 'id': '% de Gasto', 'type': 'numeric',
+         'format': Format(precision=1, scheme=Scheme.fixed).symbol(Symbol.yes).symbol_suffix('%')}
+    ]
+    if 'Proyección' in df_tabla.columns:
+        columnas += [
+            {'name': 'Proyección Cierre', 'id': 'Proyección', 'type': 'numeric', 'format': formato_miles},
+            {'name': 'Agota el', 'id': 'Agotamiento'}
+        ]
     
-    # Valores aproximados de la imagen
-    valores = [355000, 120000]  # Sem 1 y Sem 2
-    labels = ['Sem 1', 'Sem 2']
+    return html.Div([
+        dash_table.DataTable(
+            id='tabla-matriz-datos',
+            columns=columnas,
+            data=paginar_tabla(df_tabla, 0),
+            page_action='custom',
+            page_current=0,
+            page_size=FILAS_POR_PAGINA,
+            page_count=-(-len(df_tabla) // FILAS_POR_PAGINA),
+            style_as_list_view=True,
+            style_header=ESTILO_ENCABEZADO,
+            style_cell=ESTILO_CELDA,
+            style_data_conditional=[
+                {'if': {'filter_query': '{% de Gasto} > 90', 'column_id': '% de Gasto'},
+                 'color': '#FF4444', 'fontWeight': 'bold'},
+                {'if': {'filter_query': '{% de Gasto} > 70 && {% de Gasto} <= 90', 'column_id': '% de Gasto'},
+                 'color': '#FFA500', 'fontWeight': 'bold'},
+                {'if': {'filter_query': '{% de Gasto} <= 70', 'column_id': '% de Gasto'},
+                 'color': '#4CAF50', 'fontWeight': 'bold'}
+            ]
+        ),
+        html.Table([html.Tbody([_fila_total(df_tabla, total_pronostico)])], className='data-table')
+    ])
+
+@medir
+def crear_grafico_anillo_semestre(df_mensual, total_presupuesto):
+    """Crear gráfico de anillo para gastos por semestre"""
+    df_semestre = _consolidar_serie(df_mensual, 'Etiqueta Semestre')
+    total_gastado = df_semestre.sum()
+    porcentaje_gasto = total_gastado / total_presupuesto * 100 if total_presupuesto else 0
     
     fig = go.Figure(data=[go.Pie(
-        labels=labels,
-        values=valores,
+        labels=df_semestre.index,
+        values=df_semestre.values / 1000,
         hole=0.7,
-        marker=dict(colors=['#94F8FD', '#2A2A3E']),
+        marker=dict(colors=['#94F8FD', '#2A2A3E'] * len(df_semestre)),
         textinfo='label+value',
-        texttemplate='%{label}<br>%{value:,.0f} mil<br>(%{percent})',
+        texttemplate='%{label}<br>%{value:,.1f} mil<br>(%{percent})',
         textfont=dict(color='#94F8FD', size=10, family='Segoe UI'),
         hoverinfo='label+percent+value'
     )])
     
     fig.update_layout(
-        paper_bgcolor="#13121D",
+        template=plantilla(),
         plot_bgcolor="#13121D",
-        font={'color': "#94F8FD", 'family': 'Segoe UI'},
         height=250,
         margin=dict(l=20, r=20, t=20, b=20),
         showlegend=True,
@@ -294,24 +1292,29 @@ def crear_grafico_anillo_semestre(df_consolidado):
     
     # Agregar texto en el centro
     fig.add_annotation(
-        text=f"<b>Total</b><br>475,650<br>(76.6%)",
+        text=f"<b>Total</b><br>{total_gastado:,.0f}<br>({porcentaje_gasto:.1f}%)",
         x=0.5, y=0.5,
         showarrow=False,
         font=dict(size=14, color="#94F8FD", family='Segoe UI')
     )
     
     return fig
-def crear_grafico_columnas_trimestre(df_consolidado):
+@medir
+def crear_grafico_columnas_trimestre(df_mensual):
     """Crear gráfico de columnas para gastos por trimestre"""
-    # Valores aproximados de la imagen
-    trimestres = ['T1', 'T2', 'T3']
-    valores = [178570, 176780, 120300]
+    df_trimestre = _consolidar_serie(df_mensual, 'Etiqueta Trimestre')
+    valores = df_trimestre.values
+    
+    # El último trimestre (posiblemente incompleto) se resalta con otro tono
+    colores = ['#94F8FD'] * len(valores)
+    if colores:
+        colores[-1] = '#5AC8CD'
     
     fig = go.Figure(data=[
         go.Bar(
-            x=trimestres,
+            x=df_trimestre.index,
             y=valores,
-            marker_color=['#94F8FD', '#94F8FD', '#5AC8CD'],
+            marker_color=colores,
             text=[f'{v:,.0f}' for v in valores],
             textposition='outside',
             textfont=dict(color='#94F8FD', size=10, family='Segoe UI')
@@ -319,44 +1322,57 @@ def crear_grafico_columnas_trimestre(df_consolidado):
     ])
     
     fig.update_layout(
-        paper_bgcolor="#13121D",
-        plot_bgcolor="#1B1B2D",
-        font={'color': "#94F8FD", 'family': 'Segoe UI'},
+        template=plantilla(),
         xaxis=dict(
-            showgrid=False,
-            zeroline=False
+            showgrid=False
         ),
         yaxis=dict(
             showgrid=True,
-            gridcolor='#2A2A3E',
-            zeroline=False,
             showticklabels=False,
-            range=[0, 200000]
+            range=[0, valores.max() * 1.15] if len(valores) else None
         ),
-        height=300,
-        margin=dict(l=40, r=20, t=40, b=40),
-        showlegend=False
+        margin=dict(l=40, r=20, t=40, b=40)
     )
     
     return fig
 
-def crear_grafico_radar_eficiencia(df_consolidado):
-    """Crear gráfico de radar mostrando la eficiencia del presupuesto por categoría"""
-    # Calcular eficiencia por categoría
-    df_eficiencia = df_consolidado.groupby('Categoría').agg({
-        'Gastos': 'sum',
-        'Presupuesto Anual': 'first'
-    }).reset_index()
+def resumir_eficiencia(cubo, presupuesto, pronostico=None):
+    """Calcular el % de uso del presupuesto por categoría, de mayor a menor
+    
+    Con el pronóstico se agrega el % del presupuesto anual proyectado al cierre.
+    """
+    df_eficiencia = resumir_cubo(cubo, 'Categoría', presupuesto)
     
     df_eficiencia['Porcentaje_Uso'] = (df_eficiencia['Gastos'] / df_eficiencia['Presupuesto Anual'] * 100).round(1)
     df_eficiencia['Disponible'] = 100 - df_eficiencia['Porcentaje_Uso']
+    if pronostico is not None:
+        resumen = resumir_pronostico(pronostico, 'Categoría').set_index('Categoría')
+        proyectado = resumen['Proyección'] / resumen['Presupuesto Anual'] * 100
+        df_eficiencia['% Proyectado'] = df_eficiencia['Categoría'].map(proyectado).round(1).to_numpy()
     
     # Ordenar por porcentaje de uso para mejor visualización
-    df_eficiencia = df_eficiencia.sort_values('Porcentaje_Uso', ascending=False)
+    return df_eficiencia.sort_values('Porcentaje_Uso', ascending=False)
+
+@medir
+def crear_grafico_radar_eficiencia(cubo, presupuesto, pronostico=None):
+    """Crear gráfico de radar mostrando la eficiencia del presupuesto por categoría"""
+    df_eficiencia = resumir_eficiencia(cubo, presupuesto, pronostico)
     
     # Crear el gráfico de radar
     fig = go.Figure()
     
+    # Gasto proyectado al cierre del año, detrás del gasto actual
+    if '% Proyectado' in df_eficiencia.columns:
+        fig.add_trace(go.Scatterpolar(
+            r=df_eficiencia['% Proyectado'].values,
+            theta=df_eficiencia['Categoría'].values,
+            mode='lines+markers',
+            line=dict(color='#C77DFF', width=1.5),
+            marker=dict(color='#C77DFF', size=5),
+            name='% Proyectado',
+            hovertemplate='%{theta}<br>Proyectado al cierre: %{r:.1f}%<extra></extra>'
+        ))
+    
     # Agregar el trace de presupuesto usado
     fig.add_trace(go.Scatterpolar(
         r=df_eficiencia['Porcentaje_Uso'].values,
@@ -390,12 +1406,18 @@ def crear_grafico_radar_eficiencia(df_consolidado):
         hoverinfo='skip'
     ))
     
+    # El eje radial se extiende si alguna proyección supera el 120%
+    tope = 120
+    if '% Proyectado' in df_eficiencia.columns and df_eficiencia['% Proyectado'].notna().any():
+        tope = max(tope, float(df_eficiencia['% Proyectado'].max()) + 10)
+    
     fig.update_layout(
+        template=plantilla(),
         polar=dict(
             bgcolor='#1B1B2D',
             radialaxis=dict(
                 visible=True,
-                range=[0, 120],
+                range=[0, tope],
                 tickfont=dict(color='#94F8FD', size=9),
                 gridcolor='#2A2A3E',
                 linecolor='#2A2A3E',
@@ -410,10 +1432,7 @@ def crear_grafico_radar_eficiencia(df_consolidado):
                 linecolor='#94F8FD'
             )
         ),
-        paper_bgcolor='#13121D',
         plot_bgcolor='#13121D',
-        font={'color': '#94F8FD', 'family': 'Segoe UI'},
-        height=300,
         margin=dict(l=80, r=80, t=40, b=40),
         showlegend=True,
         legend=dict(
@@ -433,4 +1452,146 @@ def crear_grafico_radar_eficiencia(df_consolidado):
         )
     )
     
-    return fig 
\ No newline at end of file
+    return fig 
+# Detalle de gastos de una categoría o cuenta (clic en el gráfico o la tabla)
+PUNTOS_SERIE = 1000
+COLUMNAS_DETALLE = ['Fecha', 'Cuenta', 'Categoría', 'Departamento', 'Gastos']
+
+@medir
+def construir_indice_detalle(df_consolidado):
+    """Ordenar las posiciones del consolidado por categoría y fecha
+    
+    Devuelve las posiciones ordenadas, las fechas en ese orden y el tramo
+    [inicio, fin) de cada categoría, de modo que un rango de fechas dentro de
+    una categoría se ubica con dos búsquedas binarias.
+    """
+    codigos, categorias = pd.factorize(df_consolidado['Categoría'], sort=True)
+    fechas = df_consolidado['Fecha'].to_numpy()
+    orden = np.lexsort((fechas, codigos))
+    limites = np.searchsorted(codigos[orden], np.arange(len(categorias) + 1))
+    return {
+        'orden': orden,
+        'fechas': fechas[orden],
+        'tramos': {categoria: (inicio, fin) for categoria, inicio, fin
+                   in zip(categorias.tolist(), limites[:-1].tolist(), limites[1:].tolist())}
+    }
+
+def rangos_fechas(años, meses=None):
+    """Convertir los años y el rango de meses en rangos de fechas [desde, hasta) ordenados"""
+    mes_inicio, mes_fin = meses or (1, 12)
+    return [(pd.Timestamp(int(año), mes_inicio, 1), pd.Timestamp(int(año), mes_fin, 1) + pd.offsets.MonthBegin())
+            for año in sorted(años)]
+
+def buscar_detalle(indice, categoria, rangos=None):
+    """Posiciones del consolidado de una categoría dentro de los rangos de fechas, ordenadas por fecha"""
+    inicio, fin = indice['tramos'].get(categoria, (0, 0))
+    if rangos is None:
+        return indice['orden'][inicio:fin]
+    
+    fechas = indice['fechas'][inicio:fin]
+    desde = np.array([d for d, _ in rangos], dtype='datetime64[ns]').astype(fechas.dtype)
+    hasta = np.array([h for _, h in rangos], dtype='datetime64[ns]').astype(fechas.dtype)
+    inicios = inicio + np.searchsorted(fechas, desde, side='left')
+    fines = inicio + np.searchsorted(fechas, hasta, side='left')
+    return np.concatenate([indice['orden'][:0]] + [indice['orden'][a:b] for a, b in zip(inicios, fines)])
+
+def detallar_gastos(df_consolidado, indice, categoria, rangos=None, cuentas=None, departamentos=None):
+    """Posiciones de los gastos de una categoría que cumplen los filtros del dashboard
+    
+    Sólo las filas de los rangos encontrados se comparan contra cuentas y departamentos.
+    """
+    posiciones = buscar_detalle(indice, categoria, rangos)
+    mascara = np.ones(len(posiciones), dtype=bool)
+    if cuentas:
+        mascara &= np.isin(df_consolidado['Cuenta'].to_numpy()[posiciones], cuentas)
+    if departamentos:
+        mascara &= df_consolidado['Departamento'].iloc[posiciones].isin(departamentos).to_numpy()
+    return posiciones[mascara]
+
+def serie_diaria(df_consolidado, posiciones):
+    """Sumar por día los gastos de las posiciones (ordenadas por fecha)"""
+    dias = df_consolidado['Fecha'].to_numpy()[posiciones].astype('datetime64[D]')
+    gastos = df_consolidado['Gastos'].to_numpy()[posiciones].astype(np.float64)
+    if not len(dias):
+        return dias, gastos
+    unicos, inicios = np.unique(dias, return_index=True)
+    return unicos, np.add.reduceat(gastos, inicios)
+
+def lttb(x, y, umbral=PUNTOS_SERIE):
+    """Índices de los puntos que conserva Largest-Triangle-Three-Buckets
+    
+    Se mantienen el primer y el último punto; de cada cubeta intermedia se elige
+    el punto que forma el triángulo de mayor área con el punto elegido antes y
+    el promedio de la cubeta siguiente, lo que preserva picos y valles.
+    """
+    n = len(x)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    limites = np.linspace(1, n - 1, umbral - 1).astype(np.int64)
+    indices = np.empty(umbral, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for i in range(umbral - 2):
+        inicio, fin = limites[i], limites[i + 1]
+        siguiente = slice(fin, limites[i + 2] if i + 2 < len(limites) else n)
+        promedio_x, promedio_y = x[siguiente].mean(), y[siguiente].mean()
+        area = np.abs((x[anterior] - promedio_x) * (y[inicio:fin] - y[anterior])
+                      - (x[anterior] - x[inicio:fin]) * (promedio_y - y[anterior]))
+        anterior = inicio + int(np.argmax(area))
+        indices[i + 1] = anterior
+    return indices
+
+@medir
+def crear_grafico_detalle(dias, gastos, umbral=PUNTOS_SERIE):
+    """Crear la serie diaria del detalle, reducida a umbral puntos con LTTB"""
+    seleccion = lttb(dias.astype(np.int64), gastos, umbral)
+    
+    fig = go.Figure(data=[
+        go.Scatter(
+            x=dias[seleccion],
+            y=gastos[seleccion],
+            mode='lines',
+            line=dict(color='#94F8FD', width=2),
+            hovertemplate='%{x|%d/%m/%Y}<br>%{y:,.0f}<extra></extra>'
+        )
+    ])
+    
+    fig.update_layout(
+        template=plantilla(),
+        xaxis=dict(showgrid=True),
+        yaxis=dict(showgrid=True),
+        margin=dict(l=60, r=20, t=20, b=40)
+    )
+    
+    return fig
+
+def paginar_detalle(df_consolidado, posiciones, pagina, filas_por_pagina=FILAS_POR_PAGINA):
+    """Devolver los registros de una página del detalle de gastos"""
+    inicio = pagina * filas_por_pagina
+    pagina_df = df_consolidado.iloc[posiciones[inicio:inicio + filas_por_pagina]][COLUMNAS_DETALLE]
+    return pagina_df.assign(Fecha=_formatear_fechas(pagina_df['Fecha'])).to_dict('records')
+
+def crear_tabla_detalle():
+    """Crear la DataTable del detalle de gastos, paginada en el servidor"""
+    formato_miles = Format(group=Group.yes, precision=0, scheme=Scheme.fixed)
+    return dash_table.DataTable(
+        id='tabla-detalle',
+        columns=[
+            {'name': 'Fecha', 'id': 'Fecha'},
+            {'name': 'Cuenta', 'id': 'Cuenta'},
+            {'name': 'Categoría', 'id': 'Categoría'},
+            {'name': 'Departamento', 'id': 'Departamento'},
+            {'name': 'Gastos', 'id': 'Gastos', 'type': 'numeric', 'format': formato_miles}
+        ],
+        data=[],
+        page_action='custom',
+        page_current=0,
+        page_size=FILAS_POR_PAGINA,
+        page_count=0,
+        style_as_list_view=True,
+        style_header=ESTILO_ENCABEZADO,
+        style_cell=ESTILO_CELDA
+    )
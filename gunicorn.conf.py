@@ -0,0 +1,27 @@
+# Configuración de gunicorn: gunicorn app:server
+# Arranque rápido (datos e importaciones pesadas diferidos): gunicorn arranque:aplicacion
+import os
+
+bind = os.environ.get('DASHBOARD_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('DASHBOARD_WORKERS', '4'))
+
+# Los workers mapean la caché columnar en lugar de cargar su propia copia
+os.environ.setdefault('DASHBOARD_MEMORIA_COMPARTIDA', '1')
+
+CARGA_DIFERIDA = os.environ.get('DASHBOARD_CARGA_DIFERIDA') == '1'
+
+
+def on_starting(server):
+    """Construir la caché una sola vez en el proceso maestro antes de crear los workers"""
+    # En modo diferido el maestro no importa pandas: el primer worker construye la caché
+    if CARGA_DIFERIDA:
+        return
+    from funciones import cargar_datos
+    cargar_datos()
+
+
+def post_worker_init(worker):
+    """Calentar la app y los datos en segundo plano mientras /salud ya responde"""
+    if CARGA_DIFERIDA:
+        import arranque
+        arranque.precalentar()
@@ -0,0 +1,147 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# Instrumentación opcional: con DASHBOARD_INSTRUMENTACION=1 se miden las etapas
+# decoradas; desactivada, los decoradores devuelven la función original
+ACTIVA = os.environ.get('DASHBOARD_INSTRUMENTACION') == '1'
+
+# Límites (en segundos) de las cubetas del histograma de latencias
+LIMITES = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Segundos de cada módulo importado con importar(), en orden de importación
+IMPORTACIONES = {}
+
+_registros = {}
+_bloqueo = threading.Lock()
+_solicitud = threading.local()
+
+def registrar(nombre, segundos):
+    """Acumular una medición en el histograma de la etapa y en la solicitud en curso"""
+    with _bloqueo:
+        registro = _registros.get(nombre)
+        if registro is None:
+            registro = _registros[nombre] = {'conteo': 0, 'suma': 0.0, 'cubetas': [0] * len(LIMITES)}
+        registro['conteo'] += 1
+        registro['suma'] += segundos
+        for i, limite in enumerate(LIMITES):
+            if segundos <= limite:
+                registro['cubetas'][i] += 1
+    
+    tiempos = getattr(_solicitud, 'tiempos', None)
+    if tiempos is not None:
+        tiempos.append((nombre, segundos))
+
+def medir(funcion=None, *, nombre=None):
+    """Decorador que mide la duración de cada llamada a la función
+    
+    Se usa como @medir o @medir(nombre='etapa') cuando varias funciones comparten
+    el mismo __name__ (p. ej. callbacks registrados en un bucle).
+    """
+    if funcion is None:
+        return lambda funcion: medir(funcion, nombre=nombre)
+    if not ACTIVA:
+        return funcion
+    
+    etapa = nombre or funcion.__name__
+    
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            registrar(etapa, time.perf_counter() - inicio)
+    return envoltura
+
+@contextmanager
+def _bloque_medido(nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nombre, time.perf_counter() - inicio)
+
+def bloque(nombre):
+    """Medir un bloque de código (p. ej. cada merge dentro de una función)"""
+    return _bloque_medido(nombre) if ACTIVA else nullcontext()
+
+def importar(nombre):
+    """Importar un módulo midiendo su tiempo de importación
+    
+    Sólo se mide la primera importación; el tiempo es el marginal, sin lo que
+    ya habían importado los módulos anteriores. Se registra siempre (no
+    depende de ACTIVA) porque ocurre una vez por proceso.
+    """
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nombre)
+    segundos = time.perf_counter() - inicio
+    IMPORTACIONES[nombre] = segundos
+    registrar(f'importar:{nombre}', segundos)
+    return modulo
+
+def iniciar_solicitud():
+    """Empezar a acumular las mediciones de la solicitud HTTP en curso"""
+    _solicitud.tiempos = []
+
+def terminar_solicitud():
+    """Devolver el valor de la cabecera Server-Timing de la solicitud en curso"""
+    tiempos = getattr(_solicitud, 'tiempos', None) or []
+    _solicitud.tiempos = None
+    return ', '.join(f'{nombre.replace(":", "-")};dur={segundos * 1000:.2f}' for nombre, segundos in tiempos)
+
+def _memoria_rss():
+    """Memoria residente actual del proceso en bytes (Linux), o None"""
+    try:
+        with open('/proc/self/statm') as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def exportar_prometheus(caches=None, indicadores=None):
+    """Generar el texto de exposición de Prometheus
+    
+    caches: {nombre: CacheInfo} de los caches LRU; indicadores: {nombre: valor}
+    con métricas puntuales adicionales (p. ej. la versión de los datos).
+    """
+    lineas = [
+        '# HELP dashboard_duracion_segundos Duración de las etapas instrumentadas',
+        '# TYPE dashboard_duracion_segundos histogram'
+    ]
+    with _bloqueo:
+        registros = {nombre: dict(registro, cubetas=list(registro['cubetas']))
+                     for nombre, registro in _registros.items()}
+    for nombre, registro in sorted(registros.items()):
+        for limite, conteo in zip(LIMITES, registro['cubetas']):
+            lineas.append(f'dashboard_duracion_segundos_bucket{{etapa="{nombre}",le="{limite}"}} {conteo}')
+        lineas.append(f'dashboard_duracion_segundos_bucket{{etapa="{nombre}",le="+Inf"}} {registro["conteo"]}')
+        lineas.append(f'dashboard_duracion_segundos_sum{{etapa="{nombre}"}} {registro["suma"]:.6f}')
+        lineas.append(f'dashboard_duracion_segundos_count{{etapa="{nombre}"}} {registro["conteo"]}')
+    
+    if caches:
+        lineas += ['# HELP dashboard_cache_aciertos_total Aciertos de los caches LRU',
+                   '# TYPE dashboard_cache_aciertos_total counter']
+        lineas += [f'dashboard_cache_aciertos_total{{cache="{nombre}"}} {info.hits}'
+                   for nombre, info in caches.items()]
+        lineas += ['# HELP dashboard_cache_fallos_total Fallos de los caches LRU',
+                   '# TYPE dashboard_cache_fallos_total counter']
+        lineas += [f'dashboard_cache_fallos_total{{cache="{nombre}"}} {info.misses}'
+                   for nombre, info in caches.items()]
+        lineas += ['# HELP dashboard_cache_entradas Entradas ocupadas de los caches LRU',
+                   '# TYPE dashboard_cache_entradas gauge']
+        lineas += [f'dashboard_cache_entradas{{cache="{nombre}"}} {info.currsize}'
+                   for nombre, info in caches.items()]
+    
+    indicadores = dict(indicadores or {})
+    rss = _memoria_rss()
+    if rss is not None:
+        indicadores['dashboard_memoria_rss_bytes'] = rss
+    for nombre, valor in indicadores.items():
+        lineas += [f'# TYPE {nombre} gauge', f'{nombre} {valor}']
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,31 @@
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+# Los módulos del dashboard viven en la raíz del repositorio
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+@pytest.fixture
+def cargar_app(tmp_path, monkeypatch):
+    """Importar la app desde cero sobre una copia del libro en un directorio temporal
+    
+    Las variables DASHBOARD_* se pasan como argumentos; la recarga en segundo
+    plano queda desactivada y la ingesta sólo revisa al arrancar.
+    """
+    def _cargar(**entorno):
+        if not os.path.exists(tmp_path / 'Base de Datos.xlsx'):
+            shutil.copy(os.path.join(RAIZ, 'Base de Datos.xlsx'), tmp_path / 'Base de Datos.xlsx')
+        monkeypatch.chdir(tmp_path)
+        entorno = {'DASHBOARD_INTERVALO_RECARGA': '0', 'DASHBOARD_INTERVALO_ENTRADA': '3600', **entorno}
+        for nombre, valor in entorno.items():
+            monkeypatch.setenv(nombre, valor)
+        for modulo in ('app', 'funciones'):
+            sys.modules.pop(modulo, None)
+        return importlib.import_module('app')
+    
+    yield _cargar
+    sys.modules.pop('app', None)
@@ -0,0 +1,126 @@
+import gc
+import os
+import weakref
+
+import pandas as pd
+import pytest
+from dash.exceptions import PreventUpdate
+
+import funciones
+from benchmark import escribir_libro
+
+def test_primera_solicitud_con_carga_diferida(cargar_app):
+    app = cargar_app(DASHBOARD_CARGA_DIFERIDA='1')
+    cliente = app.server.test_client()
+    
+    # La primera solicitud es la sonda de vida: responde sin esperar los datos
+    assert cliente.get('/salud').status_code == 200
+    assert app.datos is None
+    assert cliente.get('/listo').status_code == 503
+    
+    # El layout real llega con la primera página, que dispara la carga
+    respuesta = cliente.get('/_dash-layout')
+    assert respuesta.status_code == 200
+    assert app.datos is not None
+    assert 'filtro-anio' in respuesta.get_data(as_text=True)
+    assert cliente.get('/listo').status_code == 200
+
+def _gastos(app, nombre, filas):
+    """Incorporar filas (fecha, cuenta, gastos) como si llegaran en un archivo de entrada"""
+    return app.agregar_gastos([(nombre, app.normalizar_gastos_nuevos(
+        pd.DataFrame(filas, columns=['Fecha', 'Cuenta', 'Gastos'])))])
+
+def test_instantáneas_anteriores_se_liberan_tras_la_ingesta(cargar_app):
+    app = cargar_app()
+    cliente = app.server.test_client()
+    anteriores = []
+    for i in range(3):
+        anteriores.append(weakref.ref(app.datos))
+        assert cliente.get('/api/agregados?por=Categoría').status_code == 200
+        _gastos(app, f'lote-{i}.csv', [('2019-09-01', 310001, 100.0)])
+    gc.collect()
+    assert all(referencia() is None for referencia in anteriores)
+
+def test_detalle_con_fechas_nulas(cargar_app, tmp_path):
+    df_gastos, df_presupuesto, df_calendario = funciones.leer_excel('Base de Datos.xlsx')
+    df_gastos.loc[0, 'Fecha'] = pd.NaT
+    escribir_libro(tmp_path / 'Base de Datos.xlsx', df_gastos, df_presupuesto, df_calendario)
+    app = cargar_app()
+    
+    assert app.datos.cubo['Año'].isna().any()
+    assert app.listar_años(app.datos.cubo) == [2019]
+    layout = app.server.test_client().get('/_dash-layout').get_data(as_text=True)
+    assert '"label":"2019"' in layout.replace(' ', '')
+    
+    # Con y sin años seleccionados, y con el año tal como llega desde el cubo
+    categoria = df_presupuesto['Categoría'].iloc[0]
+    for años in (None, (2019,), (2019.0,)):
+        detalle = app.construir_detalle(app.datos, (categoria, None), años, None, None, None, None)
+        assert len(detalle['posiciones']) > 0
+
+def test_el_intervalo_compara_la_huella_y_no_la_versión(cargar_app):
+    app = cargar_app()
+    huella = app.identificar_datos(app.datos)
+    layout = app.server.test_client().get('/_dash-layout').get_data(as_text=True)
+    assert huella in layout
+    
+    # Otro worker con los mismos datos puede tener otro número de versión
+    app.publicar(app.datos.reemplazar(version=app.datos.version + 5))
+    with pytest.raises(PreventUpdate):
+        app.detectar_version(1, huella)
+    
+    _gastos(app, 'lote.csv', [('2019-09-01', 310001, 100.0)])
+    assert app.detectar_version(2, huella) == app.identificar_datos(app.datos) != huella
+
+def test_recarga_tras_la_ingesta_no_duplica_gastos(cargar_app):
+    app = cargar_app()
+    total = app.datos.df_consolidado['Gastos'].sum()
+    os.makedirs(app.DIRECTORIO_ENTRADA, exist_ok=True)
+    pd.DataFrame({'Fecha': ['2019-09-01', '2019-09-02'], 'Cuenta': [310001, 310002], 'Gastos': [100, 50]}).to_csv(
+        os.path.join(app.DIRECTORIO_ENTRADA, 'nuevos.csv'), index=False)
+    
+    app.revisar_directorio_entrada()
+    assert app.datos.df_consolidado['Gastos'].sum() == total + 150
+    # El archivo aplicado queda archivado, fuera de los pendientes
+    assert os.listdir(app.DIRECTORIO_APLICADOS) == ['nuevos.csv']
+    assert not os.path.exists(os.path.join(app.DIRECTORIO_ENTRADA, 'nuevos.csv'))
+    
+    app.recargar_datos()
+    app.revisar_directorio_entrada()
+    assert app.datos.df_consolidado['Gastos'].sum() == total + 150
+    assert app.datos.cubo['Gastos'].sum() == total + 150
+    assert app.datos.archivos_aplicados == {'nuevos.csv'}
+
+def test_alta_por_http(cargar_app):
+    app = cargar_app()
+    cliente = app.server.test_client()
+    respuesta = cliente.post('/api/gastos', json=[{'Fecha': '2019-09-01', 'Cuenta': 310001, 'Gastos': 10}])
+    assert respuesta.status_code == 201
+    assert len(os.listdir(app.DIRECTORIO_APLICADOS)) == 1
+    assert cliente.post('/api/gastos', json=[{'Fecha': 'ayer', 'Cuenta': 310001, 'Gastos': 10}]).status_code == 400
+
+def test_velocímetro_con_varios_años(cargar_app, tmp_path):
+    # 2018 repite los gastos de 2019 un año antes
+    df_gastos, df_presupuesto, df_calendario = funciones.leer_excel('Base de Datos.xlsx')
+    anterior = df_gastos.assign(Fecha=df_gastos['Fecha'] - pd.DateOffset(years=1))
+    escribir_libro(tmp_path / 'Base de Datos.xlsx', pd.concat([anterior, df_gastos]), df_presupuesto, df_calendario)
+    app = cargar_app()
+    
+    un_año = app.preparar_vista(app.datos, (2019,), None, None, None, None)
+    dos_años = app.preparar_vista(app.datos, (2018, 2019), None, None, None, None)
+    assert dos_años['metricas'][1] == 2 * un_año['metricas'][1]
+    assert dos_años['proyeccion'] == pytest.approx(2 * un_año['proyeccion'])
+    # Sin años seleccionados la vista abarca ambos
+    todos = app.preparar_vista(app.datos, None, None, None, None, None)
+    assert todos['proyeccion'] == pytest.approx(dos_años['proyeccion'])
+    
+    figura = app.construir_salida('velocimetro', app.datos, ((2018, 2019), None, None, None, None))[0]
+    assert figura['data'][0]['gauge']['axis']['range'][1] == max(dos_años['metricas'][1], dos_años['proyeccion'])
+    assert f"{dos_años['proyeccion'] / 1000:,.0f} mil" in str(figura)
+
+def test_subtítulo_sigue_a_los_filtros(cargar_app):
+    app = cargar_app()
+    layout = app.server.test_client().get('/_dash-layout').get_data(as_text=True)
+    assert 'Enero - Agosto de 2019' in layout
+    assert app.actualizar_subtitulo([2019], [3, 5], None) == 'Marzo - Mayo de 2019'
+    assert app.actualizar_subtitulo([2019], [1, 12], None) == 'Enero - Agosto de 2019'
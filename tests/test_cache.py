@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+import funciones as f
+
+LIBRO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Base de Datos.xlsx')
+
+@pytest.fixture
+def libro(tmp_path):
+    """Copia del libro de ejemplo con su caché ya construida"""
+    ruta = str(tmp_path / 'libro.xlsx')
+    ruta_cache = str(tmp_path / 'cache')
+    shutil.copy(LIBRO, ruta)
+    f.cargar_datos(ruta, ruta_cache)
+    return ruta, ruta_cache
+
+def _meta(ruta_cache):
+    with open(os.path.join(ruta_cache, 'actual.json'), encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+def test_cache_vigente_devuelve_las_tablas(libro):
+    ruta, ruta_cache = libro
+    datos = f.leer_cache(ruta, ruta_cache)
+    assert datos is not None
+    assert len(datos) == len(f.TABLAS)
+
+def test_cache_sigue_vigente_tras_tocar_el_libro(libro, monkeypatch):
+    ruta, ruta_cache = libro
+    estado = os.stat(ruta)
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+    
+    llamadas = []
+    hash_origen = f._hash_origen
+    monkeypatch.setattr(f, '_hash_origen', lambda r: llamadas.append(r) or hash_origen(r))
+    assert f.leer_cache(ruta, ruta_cache) is not None
+    assert f.leer_cache(ruta, ruta_cache) is not None
+    
+    # El hash se calcula una sola vez y el nuevo mtime queda registrado
+    assert len(llamadas) == 1
+    assert _meta(ruta_cache)['mtime_ns'] == os.stat(ruta).st_mtime_ns
+
+def test_cache_se_invalida_si_cambia_el_contenido(libro):
+    ruta, ruta_cache = libro
+    with open(ruta, 'r+b') as archivo:
+        archivo.seek(-1, os.SEEK_END)
+        ultimo = archivo.read(1)
+        archivo.seek(-1, os.SEEK_END)
+        archivo.write(bytes([ultimo[0] ^ 0xFF]))
+    assert f.leer_cache(ruta, ruta_cache) is None
+
+def test_cache_se_invalida_si_cambia_el_tamano(libro):
+    ruta, ruta_cache = libro
+    with open(ruta, 'ab') as archivo:
+        archivo.write(b'\0')
+    assert f.leer_cache(ruta, ruta_cache) is None
+
+def test_cache_de_otro_formato_no_se_usa(libro):
+    ruta, ruta_cache = libro
+    meta = _meta(ruta_cache)
+    meta['formato'] = f.FORMATO_CACHE - 1
+    with open(os.path.join(ruta_cache, 'actual.json'), 'w', encoding='utf-8') as archivo:
+        json.dump(meta, archivo)
+    assert f.leer_cache(ruta, ruta_cache) is None
+
+def test_version_de_la_cache_incluye_el_formato(libro):
+    _, ruta_cache = libro
+    version = _meta(ruta_cache)['version']
+    assert version.startswith(f'{f.FORMATO_CACHE}-')
+    assert os.path.exists(os.path.join(ruta_cache, version, 'validacion.json'))
+    assert f.leer_validacion(ruta_cache) is not None
+
+def test_libro_modificado_durante_la_lectura_no_se_guarda(tmp_path, monkeypatch):
+    ruta = str(tmp_path / 'libro.xlsx')
+    ruta_cache = str(tmp_path / 'cache')
+    shutil.copy(LIBRO, ruta)
+    
+    # Libro con una fila de gastos más, que se guarda mientras se procesa el original
+    df_gastos, df_presupuesto, df_calendario = f.leer_excel(LIBRO)
+    nuevo = str(tmp_path / 'nuevo.xlsx')
+    with pd.ExcelWriter(nuevo) as escritor:
+        pd.concat([df_gastos, df_gastos.tail(1)]).to_excel(escritor, sheet_name='Gastos', index=False)
+        df_presupuesto.to_excel(escritor, sheet_name='Presupuesto', index=False)
+        df_calendario.to_excel(escritor, sheet_name='Tabla Calendario', index=False)
+    
+    procesar_datos = f.procesar_datos
+    def procesar_y_guardar(*args, **kwargs):
+        resultado = procesar_datos(*args, **kwargs)
+        shutil.copy(nuevo, ruta)
+        return resultado
+    monkeypatch.setattr(f, 'procesar_datos', procesar_y_guardar)
+    filas = len(f.cargar_datos(ruta, ruta_cache)[0])
+    assert filas == len(df_gastos)
+    assert f.leer_cache(ruta, ruta_cache) is None
+    
+    # La siguiente carga lee el libro nuevo
+    monkeypatch.setattr(f, 'procesar_datos', procesar_datos)
+    assert len(f.cargar_datos(ruta, ruta_cache)[0]) == filas + 1
+    assert len(f.leer_cache(ruta, ruta_cache)[0]) == filas + 1
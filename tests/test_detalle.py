@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import funciones as f
+
+@pytest.fixture
+def consolidado():
+    generador = np.random.default_rng(7)
+    n = 500
+    fechas = pd.Timestamp('2019-01-01') + pd.to_timedelta(generador.integers(0, 3 * 365, n), unit='D')
+    df = pd.DataFrame({
+        'Fecha': fechas,
+        'Cuenta': generador.integers(1, 6, n),
+        'Categoría': pd.Categorical(generador.choice(['Equipos', 'Viajes', 'Servicios'], n)),
+        'Departamento': pd.Categorical(generador.choice(['Ventas', 'RRHH'], n)),
+        'Gastos': generador.uniform(1, 1000, n)
+    })
+    df.loc[3, 'Fecha'] = pd.NaT
+    return df
+
+@pytest.mark.parametrize('n, umbral', [(10, 3), (11, 10), (1001, 1000), (5000, 1000), (5000, 7)])
+def test_lttb_conserva_extremos_y_devuelve_umbral_indices(n, umbral):
+    y = np.random.default_rng(n).normal(size=n)
+    indices = f.lttb(np.arange(n), y, umbral)
+    assert len(indices) == umbral
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert (np.diff(indices) > 0).all()
+
+@pytest.mark.parametrize('n, umbral', [(0, 10), (5, 10), (10, 10), (10, 2)])
+def test_lttb_sin_reducción_devuelve_todos_los_puntos(n, umbral):
+    assert f.lttb(np.arange(n), np.zeros(n), umbral).tolist() == list(range(n))
+
+def test_lttb_conserva_los_picos():
+    y = np.zeros(10000)
+    y[4321] = 100
+    assert 4321 in f.lttb(np.arange(len(y)), y, 100)
+
+def test_buscar_detalle_coincide_con_el_filtro_directo(consolidado):
+    indice = f.construir_indice_detalle(consolidado)
+    rangos = f.rangos_fechas([2021, 2019], (3, 5))
+    posiciones = f.buscar_detalle(indice, 'Viajes', rangos)
+    
+    fechas = consolidado['Fecha']
+    esperado = consolidado[(consolidado['Categoría'] == 'Viajes') & fechas.notna()
+                           & fechas.dt.year.isin([2019, 2021]) & fechas.dt.month.between(3, 5)]
+    assert sorted(posiciones.tolist()) == sorted(esperado.index.tolist())
+    assert fechas.iloc[posiciones].is_monotonic_increasing
+
+def test_buscar_detalle_sin_rangos_devuelve_toda_la_categoría(consolidado):
+    indice = f.construir_indice_detalle(consolidado)
+    posiciones = f.buscar_detalle(indice, 'Equipos')
+    assert len(posiciones) == (consolidado['Categoría'] == 'Equipos').sum()
+
+def test_buscar_detalle_vacío(consolidado):
+    indice = f.construir_indice_detalle(consolidado)
+    assert len(f.buscar_detalle(indice, 'Inexistente', f.rangos_fechas([2019]))) == 0
+    assert len(f.buscar_detalle(indice, 'Viajes', [])) == 0
+
+def test_detallar_gastos_aplica_cuentas_y_departamentos(consolidado):
+    indice = f.construir_indice_detalle(consolidado)
+    posiciones = f.detallar_gastos(consolidado, indice, 'Servicios', f.rangos_fechas([2020]),
+                                   cuentas=[1, 2], departamentos=['RRHH'])
+    filas = consolidado.iloc[posiciones]
+    assert len(filas)
+    assert filas['Cuenta'].isin([1, 2]).all() and (filas['Departamento'] == 'RRHH').all()
+    assert (filas['Fecha'].dt.year == 2020).all()
+
+def test_serie_diaria_suma_por_día(consolidado):
+    indice = f.construir_indice_detalle(consolidado)
+    posiciones = f.buscar_detalle(indice, 'Viajes', f.rangos_fechas([2020]))
+    dias, gastos = f.serie_diaria(consolidado, posiciones)
+    
+    esperado = consolidado.iloc[posiciones].groupby(consolidado['Fecha'].iloc[posiciones].dt.normalize())['Gastos'].sum()
+    assert (dias == esperado.index.to_numpy().astype('datetime64[D]')).all()
+    assert np.allclose(gastos, esperado.to_numpy())
+
+def test_serie_diaria_sin_posiciones(consolidado):
+    dias, gastos = f.serie_diaria(consolidado, np.array([], dtype=np.int64))
+    assert len(dias) == 0 and len(gastos) == 0
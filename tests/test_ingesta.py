@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import funciones as f
+from benchmark import generar_datos
+
+@pytest.fixture(scope='module')
+def consolidado():
+    return f.procesar_datos(*generar_datos(5000))[3]
+
+def _delta(consolidado, departamentos):
+    delta = consolidado.sample(200, random_state=1).astype({'Departamento': str})
+    delta.iloc[:len(departamentos), delta.columns.get_loc('Departamento')] = departamentos
+    return delta
+
+@pytest.mark.parametrize('departamentos', [[], ['Administración', 'Ventas'], [None]])
+def test_concatenar_consolidado_intercala_sin_reordenar(consolidado, departamentos):
+    delta = _delta(consolidado, departamentos)
+    resultado = f.concatenar_consolidado(consolidado, delta)
+    esperado = f.ordenar_particiones(f.concatenar_tipados(consolidado, delta))
+    pd.testing.assert_frame_equal(resultado, esperado)
+    assert resultado['Cuenta'].dtype == consolidado['Cuenta'].dtype
+
+def test_concatenar_consolidado_con_años_nuevos_y_nulos(consolidado):
+    delta = _delta(consolidado, [])
+    delta.iloc[:3, delta.columns.get_loc('Año')] = 2017
+    delta.iloc[3:6, delta.columns.get_loc('Año')] = np.nan
+    resultado = f.concatenar_consolidado(consolidado, delta)
+    pd.testing.assert_frame_equal(resultado, f.ordenar_particiones(f.concatenar_tipados(consolidado, delta)))
+    assert resultado['Año'].iloc[:3].tolist() == [2017] * 3
+    assert resultado['Año'].iloc[-3:].isna().all()
@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+import pytest
+
+import funciones as f
+from benchmark import escribir_libro
+
+LIBRO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Base de Datos.xlsx')
+
+@pytest.fixture
+def hojas():
+    return f.leer_excel(LIBRO)
+
+def test_directorio_con_un_solo_libro(tmp_path, hojas):
+    origen = tmp_path / 'libros'
+    origen.mkdir()
+    escribir_libro(origen / 'rrhh.xlsx', *hojas)
+    df_gastos, df_presupuesto, _, df_consolidado = f.cargar_datos(str(origen), str(tmp_path / 'cache'))
+    assert len(df_gastos) == len(df_consolidado) == len(hojas[0])
+    assert len(df_presupuesto) == len(hojas[1])
+
+def test_directorio_con_el_mismo_presupuesto_en_cada_libro(tmp_path, hojas):
+    df_gastos, df_presupuesto, df_calendario = hojas
+    origen = tmp_path / 'libros'
+    origen.mkdir()
+    escribir_libro(origen / 'a.xlsx', df_gastos.head(30), df_presupuesto, df_calendario)
+    # El segundo libro repite sólo una parte del presupuesto
+    escribir_libro(origen / 'b.xlsx', df_gastos.iloc[30:], df_presupuesto.head(4), df_calendario)
+    df_gastos_leidos, df_presupuesto_leido, _ = f.leer_libros(f.listar_libros(str(origen)))
+    assert len(df_gastos_leidos) == len(df_gastos)
+    pd.testing.assert_frame_equal(df_presupuesto_leido, df_presupuesto)
+
+def test_presupuestos_en_conflicto_entre_libros(tmp_path, hojas):
+    df_gastos, df_presupuesto, df_calendario = hojas
+    otro = df_presupuesto.head(2).assign(**{'Presupuesto Anual': 1})
+    origen = tmp_path / 'libros'
+    origen.mkdir()
+    escribir_libro(origen / 'a.xlsx', df_gastos, df_presupuesto, df_calendario)
+    escribir_libro(origen / 'b.xlsx', df_gastos.head(0), otro, df_calendario)
+    with pytest.raises(ValueError, match=str(otro['cuenta'].iloc[0])):
+        f.leer_libros(f.listar_libros(str(origen)))
+
+def test_filas_repetidas_de_un_mismo_libro_se_suman(hojas):
+    df_presupuesto = hojas[1]
+    repetido = pd.concat([df_presupuesto, df_presupuesto.head(1)], ignore_index=True)
+    assert f.unir_presupuestos([repetido, df_presupuesto]).equals(repetido)
+    indice = f.construir_indice_presupuesto(repetido)
+    cuenta = df_presupuesto['cuenta'].iloc[0]
+    assert indice.loc[cuenta, 'Presupuesto Anual'] == 2 * df_presupuesto['Presupuesto Anual'].iloc[0]
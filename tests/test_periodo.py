@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+import funciones as f
+
+@pytest.fixture(scope='module')
+def cubo():
+    """Gastos de todo 2018, de enero a agosto de 2019 y de marzo de 2021"""
+    fechas = pd.Series(list(pd.date_range('2018-01-01', '2019-08-01', freq='MS') + pd.Timedelta(days=14))
+                       + [pd.Timestamp('2021-03-10')])
+    df = pd.DataFrame({'Fecha': fechas, 'Cuenta': 1, 'Gastos': 10.0,
+                       'Categoría': 'Viajes', 'Departamento': f.DEPARTAMENTO_PREDETERMINADO})
+    return f.construir_cubo(pd.concat([df, f.derivar_calendario(df['Fecha'])], axis=1))
+
+@pytest.mark.parametrize('años, meses, esperado', [
+    ((2019,), None, 'Enero - Agosto de 2019'),
+    ((2019,), (3, 5), 'Marzo - Mayo de 2019'),
+    ((2019,), (8, 12), 'Agosto de 2019'),
+    ((2018, 2019), None, 'Enero de 2018 - Agosto de 2019'),
+    ((2018, 2019), (2, 4), 'Febrero - Abril de 2018 y 2019'),
+    ((2018, 2019, 2021), None, 'Enero - Diciembre de 2018, 2019 y 2021'),
+    ((2021,), None, 'Marzo de 2021'),
+    ((2020,), None, ''),
+    (None, None, 'Enero - Diciembre de 2018, 2019 y 2021'),
+])
+def test_describir_periodo_de_los_filtros(cubo, años, meses, esperado):
+    assert f.describir_periodo(cubo, años, meses) == esperado
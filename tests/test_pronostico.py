@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+import funciones as f
+
+def _cubo(filas):
+    """Cubo a partir de filas (fecha, cuenta, gastos) de un solo departamento"""
+    df = pd.DataFrame(filas, columns=['Fecha', 'Cuenta', 'Gastos'])
+    df['Fecha'] = pd.to_datetime(df['Fecha'])
+    df = pd.concat([df, f.derivar_calendario(df['Fecha'])], axis=1)
+    df['Categoría'] = df['Cuenta'].map({1: 'Viajes', 2: 'Equipos'})
+    df['Departamento'] = f.DEPARTAMENTO_PREDETERMINADO
+    return f.construir_cubo(df)
+
+def _indice():
+    return f.construir_indice_presupuesto(pd.DataFrame({
+        'cuenta': [1, 2],
+        'Categoría': ['Viajes', 'Equipos'],
+        'Presupuesto Anual': [1000.0, 1200.0]
+    }))
+
+def test_fechas_agotamiento_conocidas():
+    fechas = f.fechas_agotamiento([2019, 2019, 2019], [1200, 150, 1200], [200, 100, 100])
+    assert list(fechas) == [np.datetime64('2019-07-01'), np.datetime64('2019-02-15'),
+                            np.datetime64('2020-01-01')]
+
+def test_fechas_agotamiento_sin_ritmo_o_sin_presupuesto():
+    fechas = f.fechas_agotamiento([2019, 2019, 2019], [1000, 0, -5], [0, 100, 100])
+    assert np.isnat(fechas).all()
+
+def test_pronostico_de_un_año_en_curso():
+    # Cuenta 1: 100 por mes de enero a junio; el último gasto cae a mitad de mes
+    filas = [(f'2020-{mes:02d}-01', 1, 100.0) for mes in range(1, 6)] + [('2020-06-15', 1, 100.0)]
+    pronostico = _cubo(filas + [('2020-01-10', 2, 300.0)]).pipe(f.pronosticar_gasto, _indice())
+    pronostico = pronostico.set_index('Cuenta')
+    
+    assert (pronostico['Meses'] == 6).all()
+    assert pronostico.loc[1, 'Ritmo Mensual'] == 100
+    assert pronostico.loc[1, 'Proyección'] == 1200
+    assert pronostico.loc[1, 'Alerta']
+    assert pronostico.loc[1, 'Agotamiento'] == pd.Timestamp('2020-11-01')
+    # La cuenta 2 sólo gastó en enero, pero su ritmo usa los meses del año
+    assert pronostico.loc[2, 'Ritmo Mensual'] == 50
+    assert pronostico.loc[2, 'Proyección'] == 600
+    assert not pronostico.loc[2, 'Alerta']
+    assert pronostico.loc[2, 'Categoría'] == 'Equipos'
+
+def test_meses_sin_gasto_no_cuentan_como_transcurridos():
+    # Un ajuste en cero en diciembre no cierra el año
+    filas = [('2020-01-05', 1, 100.0), ('2020-03-20', 1, 200.0), ('2020-12-01', 1, 0.0)]
+    pronostico = f.pronosticar_gasto(_cubo(filas), _indice()).set_index('Cuenta')
+    assert pronostico.loc[1, 'Meses'] == 3
+    assert pronostico.loc[1, 'Proyección'] == 1200
+
+def test_pronostico_de_un_año_cerrado_no_proyecta():
+    filas = [(f'2019-{mes:02d}-28', 1, 50.0) for mes in range(1, 13)]
+    pronostico = f.pronosticar_gasto(_cubo(filas), _indice()).set_index('Cuenta')
+    assert pronostico.loc[1, 'Meses'] == 12
+    assert pronostico.loc[1, 'Proyección'] == pronostico.loc[1, 'Gastos'] == 600
+    # La cuenta sin gastos queda sin ritmo ni fecha de agotamiento
+    assert pronostico.loc[2, 'Proyección'] == 0
+    assert pd.isna(pronostico.loc[2, 'Agotamiento'])
+
+def test_filtrar_pronostico_usa_el_último_año_de_la_selección():
+    filas = [('2019-05-01', 1, 10.0), ('2020-05-01', 1, 20.0), ('2020-05-01', 2, 30.0)]
+    pronostico = f.pronosticar_gasto(_cubo(filas), _indice())
+    seleccion = f.filtrar_pronostico(pronostico, años=[2019, 2020], categorias=['Viajes'])
+    assert seleccion['Año'].tolist() == [2020]
+    assert seleccion['Gastos'].tolist() == [20]
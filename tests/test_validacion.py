@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import funciones as f
+
+LIBRO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Base de Datos.xlsx')
+
+def _hojas(filas=60):
+    """Hojas limpias: dos cuentas con montos parecidos y el calendario de 2020"""
+    generador = np.random.default_rng(3)
+    df_gastos = pd.DataFrame({
+        'Fecha': pd.Timestamp('2020-01-01') + pd.to_timedelta(generador.integers(0, 360, filas), unit='D'),
+        'Cuenta': np.tile([1, 2], filas // 2),
+        'Gastos': generador.uniform(100, 110, filas).round(2)
+    })
+    df_presupuesto = pd.DataFrame({
+        'cuenta': [1, 2],
+        'Categoría': ['Viajes', 'Equipos'],
+        'Presupuesto Anual': [10000, 20000]
+    })
+    fechas = pd.Series(pd.date_range('2020-01-01', '2020-12-31', freq='D'))
+    df_calendario = pd.concat([fechas.rename('Fecha'), f.derivar_calendario(fechas)], axis=1).astype(
+        {'Mes': str, 'Trimestre': str, 'Semestre': str, 'Mes Num': 'int64', 'Año': 'int64'})
+    return df_gastos, df_presupuesto, df_calendario
+
+def _validar(df_gastos, df_presupuesto, df_calendario):
+    return f.validar_datos(*f.procesar_datos(df_gastos, df_presupuesto, df_calendario))
+
+def _agregar(df_gastos, *filas):
+    nuevas = pd.DataFrame(filas, columns=['Fecha', 'Cuenta', 'Gastos'])
+    nuevas['Fecha'] = pd.to_datetime(nuevas['Fecha'])
+    return pd.concat([df_gastos, nuevas], ignore_index=True)
+
+def test_datos_limpios_sin_problemas():
+    reporte = _validar(*_hojas())
+    assert reporte['filas'] == 60
+    assert reporte['problemas'] == 0
+
+def test_cuentas_huérfanas_y_sin_presupuesto():
+    df_gastos, df_presupuesto, df_calendario = _hojas()
+    df_gastos = _agregar(df_gastos, ('2020-03-01', 9, 105.0), ('2020-03-02', 9, 104.0))
+    df_presupuesto.loc[len(df_presupuesto)] = [3, 'Servicios', np.nan]
+    reporte = _validar(df_gastos, df_presupuesto, df_calendario)
+    
+    assert reporte['cuentas_huerfanas'] == {'filas': 2, 'gastos': 209.0, 'cuentas': [9]}
+    assert reporte['cuentas_sin_presupuesto'] == [3]
+    assert reporte['problemas'] == 3
+
+def test_duplicadas_y_negativas():
+    df_gastos, df_presupuesto, df_calendario = _hojas()
+    df_gastos = _agregar(df_gastos, tuple(df_gastos.iloc[0]), ('2020-05-04', 1, -100.0))
+    reporte = _validar(df_gastos, df_presupuesto, df_calendario)
+    
+    assert reporte['duplicadas']['filas'] == 1
+    assert reporte['duplicadas']['muestra'][0]['Cuenta'] == int(df_gastos['Cuenta'].iloc[0])
+    assert reporte['negativas']['filas'] == 1
+    assert reporte['negativas']['gastos'] == -100.0
+    assert reporte['negativas']['muestra'] == [
+        {'Fecha': '2020-05-04', 'Cuenta': 1, 'Categoría': 'Viajes', 'Gastos': -100.0}]
+
+def test_atípicas_por_categoría():
+    df_gastos, df_presupuesto, df_calendario = _hojas()
+    df_gastos = _agregar(df_gastos, ('2020-06-01', 2, 50000.0))
+    reporte = _validar(df_gastos, df_presupuesto, df_calendario)
+    
+    assert reporte['atipicas']['filas'] == 1
+    assert reporte['atipicas']['muestra'][0]['Gastos'] == 50000.0
+    assert reporte['atipicas']['muestra'][0]['Categoría'] == 'Equipos'
+
+def test_fechas_nulas_y_fuera_del_calendario():
+    df_gastos, df_presupuesto, df_calendario = _hojas()
+    df_gastos = _agregar(df_gastos, (None, 1, 101.0), ('2021-02-03', 2, 102.0))
+    reporte = _validar(df_gastos, df_presupuesto, df_calendario)
+    
+    assert reporte['calendario']['fechas_nulas'] == 1
+    assert reporte['calendario']['fuera_calendario'] == 1
+    assert reporte['calendario']['fechas'] == ['2021-02-03']
+    assert reporte['problemas'] == 2
+
+def test_huecos_del_calendario():
+    df_gastos, df_presupuesto, df_calendario = _hojas()
+    df_calendario = df_calendario[~df_calendario['Fecha'].between('2020-12-24', '2020-12-26')]
+    df_gastos = df_gastos[~df_gastos['Fecha'].between('2020-12-24', '2020-12-26')]
+    reporte = _validar(df_gastos, df_presupuesto, df_calendario.reset_index(drop=True))
+    
+    assert reporte['calendario']['huecos'] == [['2020-12-24', '2020-12-26']]
+    assert reporte['calendario']['fuera_calendario'] == 0
+    assert reporte['problemas'] == 1
+
+@pytest.mark.skipif(not os.path.exists(LIBRO), reason='Sin el libro de ejemplo')
+def test_libro_de_ejemplo_sin_problemas():
+    reporte = _validar(*f.leer_excel(LIBRO))
+    assert reporte['problemas'] == 0